@@ -8,24 +8,69 @@ pandas analysis.
 
 from __future__ import annotations
 
+import hashlib
 import io
+import re
+import threading
+from collections import OrderedDict
 from typing import Any
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
+
+# Anchored date/datetime shapes probed against a small sample of each string
+# column, mapped to the explicit format handed to pd.to_datetime.  An explicit
+# format keeps parsing on pandas' vectorised C path instead of the per-value
+# dateutil fallback.
+_DATETIME_FORMATS: tuple[tuple[re.Pattern[str], str], ...] = (
+    (re.compile(r"^\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?$"), "ISO8601"),
+    (re.compile(r"^\d{4}/\d{2}/\d{2}$"), "%Y/%m/%d"),
+    (re.compile(r"^\d{1,2}/\d{1,2}/\d{4}$"), "%m/%d/%Y"),
+    (re.compile(r"^\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{2}$"), "%m/%d/%Y %H:%M"),
+    (re.compile(r"^\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{2}:\d{2}$"), "%m/%d/%Y %H:%M:%S"),
+)
+
+# pandas' default NA markers, so Arrow-parsed frames see the same nulls as
+# pd.read_csv would.
+_CSV_NULL_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null",
+]
+
+
+def content_hasher(data: bytes | bytearray = b"") -> "hashlib.blake2b":
+    """Hash whose digest keys deduplicated uploads; feed it chunks as they arrive."""
+    return hashlib.blake2b(data, digest_size=16)
 
 
 class IngestAgent:
     MAX_ROWS = 100_000
+    ARROW_BLOCK_BYTES = 8 << 20    # pyarrow CSV block size (unit of parallelism)
     SAMPLE_ROWS = 5
     CATEGORICAL_THRESHOLD = 0.05   # unique_count / total < 5 % → categorical
     CATEGORICAL_ABS_MAX = 50       # or fewer than 50 distinct values
+    SAMPLE_FOR_INFERENCE = 10_000  # leading rows used to classify string columns
+    CATEGORY_DTYPE_MAX = 10_000    # skip category dtype above this cardinality
+    CATEGORY_STORAGE_RATIO = 0.5   # store as category below this distinct ratio
+    DATETIME_PROBE_ROWS = 50
+    DATETIME_MATCH_RATIO = 0.95    # share of probed values that must match
+    PROFILE_CACHE_SIZE = 8         # recent uploads whose profile is kept
+
+    def __init__(self) -> None:
+        # (blake2b(file_bytes), filename) → profile, in LRU order. Frames are
+        # not kept: they belong to sessions and their memory budget.
+        # Guarded by _cache_lock: uploads are profiled in worker threads.
+        self._profile_cache: OrderedDict[tuple[bytes, str], dict[str, Any]] = OrderedDict()
+        self._cache_lock = threading.Lock()
 
     # ---------------------------------------------------------------------- #
     # Public API                                                               #
     # ---------------------------------------------------------------------- #
 
-    def ingest(self, file_bytes: bytes, filename: str) -> dict[str, Any]:
+    def ingest(self, file_bytes: bytes | bytearray, filename: str) -> dict[str, Any]:
         """
         Parse CSV bytes and return a DataProfile dict.
 
@@ -40,54 +85,176 @@ class IngestAgent:
             }],
             sample_rows: [dict, ...],
             schema_summary: str,         # human-readable block for LLM prompt
+            datetime_formats: {column: pd.to_datetime format},
         }
+
+        Date-like string columns are detected from a sample but left as
+        strings; `datetime_formats` lets the Query Agent convert a column the
+        first time a query references it.
+
+        Re-uploading identical bytes under the same filename returns the
+        cached profile without re-parsing.
         """
+        profile = self.cached_profile(content_hasher(file_bytes).digest(), filename)
+        if profile is not None:
+            return profile
+        return self.profile_and_frame(file_bytes, filename)[0]
+
+    def cached_profile(self, digest: bytes, filename: str) -> dict[str, Any] | None:
+        """The profile of an earlier upload with this content digest and filename."""
+        key = (digest, filename)
+        with self._cache_lock:
+            profile = self._profile_cache.get(key)
+            if profile is not None:
+                self._profile_cache.move_to_end(key)
+        return profile
+
+    def profile_and_frame(
+        self,
+        file_bytes: bytes | bytearray,
+        filename: str,
+        digest: bytes | None = None,
+    ) -> tuple[dict[str, Any], pd.DataFrame]:
+        """
+        Like `ingest`, but also return the parsed DataFrame the profile was
+        built from, so callers need not parse the CSV a second time. The CSV
+        is always parsed; a cached profile only saves the profiling.
+
+        `digest` is `content_hasher(file_bytes).digest()`, for callers that
+        hashed the bytes while receiving them.
+        """
+        key = (digest or content_hasher(file_bytes).digest(), filename)
         try:
-            df = pd.read_csv(io.BytesIO(file_bytes), nrows=self.MAX_ROWS)
+            df = self._read_csv(file_bytes)
         except Exception as exc:
             raise ValueError(f"Cannot parse '{filename}': {exc}") from exc
 
-        df = self._coerce_datetimes(df)
-        columns = [self._profile_col(df, c) for c in df.columns]
-        sample_rows = (
-            df.head(self.SAMPLE_ROWS)
-            .replace({np.nan: None})
-            .to_dict(orient="records")
+        cached = self.cached_profile(*key)
+        if cached is not None:
+            return cached, self._compact_categoricals(
+                df, exclude=cached["datetime_formats"]
+            )
+
+        datetime_formats = self._detect_datetime_columns(df)
+        df = self._compact_categoricals(df, exclude=datetime_formats)
+        # One vectorised reduction over every numeric column instead of
+        # separate min/max/mean scans per column.
+        numeric = df.select_dtypes(include="number")
+        numeric_stats = (
+            numeric.agg(["min", "max", "mean"]) if len(numeric.columns) else None
         )
+        columns = [
+            self._profile_col(df, c, numeric_stats, datetime_formats.get(c))
+            for c in df.columns
+        ]
+        sample_rows = _records(df.head(self.SAMPLE_ROWS))
 
-        return {
+        profile = {
             "filename": filename,
             "row_count": len(df),
             "col_count": len(df.columns),
             "columns": columns,
             "sample_rows": sample_rows,
             "schema_summary": self._schema_summary(filename, df, columns),
+            "datetime_formats": datetime_formats,
         }
+        with self._cache_lock:
+            self._profile_cache[key] = profile
+            if len(self._profile_cache) > self.PROFILE_CACHE_SIZE:
+                self._profile_cache.popitem(last=False)
+        return profile, df
 
     # ---------------------------------------------------------------------- #
     # Private helpers                                                          #
     # ---------------------------------------------------------------------- #
 
-    def _coerce_datetimes(self, df: pd.DataFrame) -> pd.DataFrame:
-        for col in df.select_dtypes(include="object").columns:
-            sample = df[col].dropna().head(20)
-            if sample.empty:
-                continue
+    def _read_csv(self, file_bytes: bytes | bytearray) -> pd.DataFrame:
+        # Parse only the first MAX_ROWS lines when the upload is longer. A
+        # line is not always a row (quoted fields may contain newlines), so
+        # if the cut yields fewer than MAX_ROWS rows, or lands inside a quoted
+        # field and fails to parse, parse the whole upload instead.
+        head = self._truncate_to_max_rows(file_bytes)
+        if head is not file_bytes:
             try:
-                parsed = pd.to_datetime(sample, infer_datetime_format=True)
-                if parsed.notna().all():
-                    df[col] = pd.to_datetime(
-                        df[col], infer_datetime_format=True, errors="coerce"
-                    )
+                df = self._parse_csv(head)
             except Exception:
-                pass
-        return df
+                df = None
+            if df is not None and len(df) >= self.MAX_ROWS:
+                return df
+        return self._parse_csv(file_bytes)
+
+    def _parse_csv(self, file_bytes: bytes | bytearray) -> pd.DataFrame:
+        # pyarrow's reader is multi-threaded but stricter about CSV dialects
+        # and does not support nrows; the C engine is the tolerant fallback
+        # (and mangles duplicate headers, which Arrow keeps verbatim).
+        try:
+            table = pacsv.read_csv(
+                pa.BufferReader(file_bytes),
+                read_options=pacsv.ReadOptions(block_size=self.ARROW_BLOCK_BYTES),
+                convert_options=pacsv.ConvertOptions(
+                    null_values=_CSV_NULL_VALUES, strings_can_be_null=True
+                ),
+            )
+            if len(set(table.column_names)) != table.num_columns:
+                raise ValueError("duplicate column names")
+        except Exception:
+            return pd.read_csv(io.BytesIO(file_bytes), nrows=self.MAX_ROWS)
+        # All-null columns become float64, as with pd.read_csv
+        for i, field in enumerate(table.schema):
+            if pa.types.is_null(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+        # Slice before converting so rows past MAX_ROWS are never converted.
+        # Rebinding drops the full table, so self_destruct can release each
+        # column's Arrow buffers once pandas has copied it; zero-copy numeric
+        # columns keep theirs alive.
+        table = table.slice(0, self.MAX_ROWS)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+
+    def _truncate_to_max_rows(self, file_bytes: bytes | bytearray) -> bytes | bytearray:
+        """
+        The header line plus the next MAX_ROWS lines, so parse time is
+        bounded by MAX_ROWS rather than by the upload size. Returns
+        `file_bytes` itself when it has no more lines than that.
+        """
+        cut = -1
+        for _ in range(self.MAX_ROWS + 1):
+            cut = file_bytes.find(b"\n", cut + 1)
+            if cut < 0:
+                return file_bytes
+        if cut + 1 >= len(file_bytes):
+            return file_bytes
+        return file_bytes[: cut + 1]
 
-    def _profile_col(self, df: pd.DataFrame, col: str) -> dict[str, Any]:
+    def _detect_datetime_columns(self, df: pd.DataFrame) -> dict[str, str]:
+        """Map each date-like string column to its pd.to_datetime format."""
+        formats: dict[str, str] = {}
+        for col in df.select_dtypes(include=["object", "string"]).columns:
+            fmt = self._detect_datetime_format(df[col])
+            if fmt is not None:
+                formats[col] = fmt
+        return formats
+
+    def _detect_datetime_format(self, s: pd.Series) -> str | None:
+        """Return the pd.to_datetime format matching a sample of `s`, if any."""
+        sample = s.dropna().head(self.DATETIME_PROBE_ROWS).astype(str).str.strip()
+        if sample.empty:
+            return None
+        for pattern, fmt in _DATETIME_FORMATS:
+            if sample.str.match(pattern).mean() > self.DATETIME_MATCH_RATIO:
+                return fmt
+        return None
+
+    def _profile_col(
+        self,
+        df: pd.DataFrame,
+        col: str,
+        numeric_stats: pd.DataFrame | None = None,
+        datetime_format: str | None = None,
+    ) -> dict[str, Any]:
         s = df[col]
+        sample = s.iloc[: self.SAMPLE_FOR_INFERENCE]
         null_count = int(s.isna().sum())
-        unique_count = int(s.nunique(dropna=True))
-        sample_values = [_py(v) for v in s.dropna().head(5).tolist()]
+        sample_values = [_py(v) for v in sample.dropna().head(5).tolist()]
         n = len(df)
 
         base: dict[str, Any] = {
@@ -95,7 +262,7 @@ class IngestAgent:
             "pandas_dtype": str(s.dtype),
             "nullable": null_count > 0,
             "null_count": null_count,
-            "unique_count": unique_count,
+            "unique_count": None,
             "sample_values": sample_values,
             "min": None,
             "max": None,
@@ -105,31 +272,85 @@ class IngestAgent:
 
         if pd.api.types.is_numeric_dtype(s):
             base["dtype"] = "numeric"
-            non_null = s.dropna()
-            if not non_null.empty:
-                base["min"] = _py(non_null.min())
-                base["max"] = _py(non_null.max())
-                base["mean"] = round(float(non_null.mean()), 4)
+            base["unique_count"] = int(s.nunique(dropna=True))
+            if null_count < n:
+                if numeric_stats is not None and col in numeric_stats.columns:
+                    stats = numeric_stats[col]
+                else:
+                    stats = s.agg(["min", "max", "mean"])
+                lo, hi = stats["min"], stats["max"]
+                if pd.api.types.is_integer_dtype(s):
+                    lo, hi = int(lo), int(hi)
+                base["min"] = _py(lo)
+                base["max"] = _py(hi)
+                base["mean"] = round(float(stats["mean"]), 4)
+            return base
 
-        elif pd.api.types.is_datetime64_any_dtype(s):
+        if datetime_format is not None:
+            # Still strings: parse only the distinct values for the range.
             base["dtype"] = "datetime"
-            non_null = s.dropna()
-            if not non_null.empty:
-                base["min"] = str(non_null.min())
-                base["max"] = str(non_null.max())
-
-        elif unique_count <= self.CATEGORICAL_ABS_MAX or (
-            n > 0 and unique_count / n < self.CATEGORICAL_THRESHOLD
-        ):
-            base["dtype"] = "categorical"
-            top = s.value_counts().head(10).index.tolist()
-            base["top_values"] = [str(v) for v in top]
+            uniques = s.dropna().unique()
+            base["unique_count"] = len(uniques)
+            parsed = pd.to_datetime(uniques, format=datetime_format, errors="coerce")
+            if parsed.notna().any():
+                base["min"] = str(parsed.min())
+                base["max"] = str(parsed.max())
+            return base
 
+        if pd.api.types.is_datetime64_any_dtype(s):
+            base["dtype"] = "datetime"
+            base["unique_count"] = int(s.nunique(dropna=True))
+            if null_count < n:
+                base["min"] = str(s.min())
+                base["max"] = str(s.max())
+            return base
+
+        # Storage dtype and profile label are decided separately: a column
+        # may be held as `category` to save memory yet still profile as text.
+        if self._looks_categorical(s):
+            base["dtype"] = "categorical"
+            counts = s.value_counts(sort=True)
+            base["unique_count"] = len(counts)
+            base["top_values"] = [str(v) for v in counts.index[:10]]
         else:
             base["dtype"] = "text"
+            base["unique_count"] = int(s.nunique(dropna=True))
 
         return base
 
+    def _looks_categorical(self, s: pd.Series) -> bool:
+        """Cardinality test on the leading SAMPLE_FOR_INFERENCE rows."""
+        sample = s.iloc[: self.SAMPLE_FOR_INFERENCE]
+        sample_unique = int(sample.nunique(dropna=True))
+        return sample_unique <= self.CATEGORICAL_ABS_MAX or (
+            len(sample) > 0
+            and sample_unique / len(sample) < self.CATEGORICAL_THRESHOLD
+        )
+
+    def _compact_categoricals(
+        self, df: pd.DataFrame, exclude: dict[str, str] | None = None
+    ) -> pd.DataFrame:
+        """
+        Store repetitive string columns as pandas `category` dtype, so the
+        cached frame holds one copy of each value plus integer codes, and
+        queries hash codes instead of strings. A column qualifies when it
+        profiles as categorical or fewer than half its values are distinct;
+        above CATEGORY_DTYPE_MAX distinct values it stays as strings.
+        """
+        n = len(df)
+        for col in df.select_dtypes(include=["object", "string"]).columns:
+            if exclude and col in exclude:
+                continue
+            cat = df[col].astype("category")
+            n_cats = len(cat.cat.categories)
+            if n_cats > self.CATEGORY_DTYPE_MAX:
+                continue
+            if n_cats < self.CATEGORY_STORAGE_RATIO * n or self._looks_categorical(
+                df[col]
+            ):
+                df[col] = cat
+        return df
+
     def _schema_summary(
         self, filename: str, df: pd.DataFrame, columns: list[dict]
     ) -> str:
@@ -158,6 +379,38 @@ class IngestAgent:
 # Utility                                                                      #
 # --------------------------------------------------------------------------- #
 
+def _records(df: pd.DataFrame) -> list[dict[str, Any]]:
+    """
+    DataFrame → list of JSON-ready row dicts (NaN/NaT → None, datetimes as
+    ISO strings, timedeltas and other objects via str). Built column-wise
+    with tolist(), which keeps floats and int64 exact (pandas' to_json caps
+    at 15 digits), instead of the per-cell loop in to_dict.
+    """
+    columns = [_json_values(df.iloc[:, i]) for i in range(df.shape[1])]
+    names = df.columns.tolist()
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+_JSON_SCALARS = (str, int, float, bool)
+
+
+def _json_values(s: pd.Series) -> list[Any]:
+    """One column of _records."""
+    kind = s.dtype.kind
+    if kind == "M":
+        values = [v.isoformat() for v in s]
+    elif kind == "m":
+        values = [str(v) for v in s]
+    else:
+        values = s.tolist()
+        if kind == "O":
+            values = [v if isinstance(v, _JSON_SCALARS) else str(v) for v in values]
+    mask = s.isna().to_numpy()
+    for i in np.flatnonzero(mask):
+        values[i] = None
+    return values
+
+
 def _py(val: Any) -> Any:
     """Convert numpy scalar → native Python for JSON serialisation."""
     if isinstance(val, np.integer):
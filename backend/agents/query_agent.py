@@ -13,15 +13,26 @@ they are trivially bypassable via Python's class hierarchy.
 from __future__ import annotations
 
 import ast
+import functools
+import hashlib
 import json
-import re
 import textwrap
+import threading
+import types
+import weakref
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from contextlib import aclosing
 from typing import Any
 
+import anyio
 import numpy as np
 import pandas as pd
+from cachetools import TTLCache
 from openai import AsyncOpenAI
 
+from .ingest_agent import _records
+
 # --------------------------------------------------------------------------- #
 # System prompt                                                                #
 # --------------------------------------------------------------------------- #
@@ -57,6 +68,9 @@ SYSTEM_PROMPT = textwrap.dedent("""
     - For date filtering use pd.to_datetime() where needed.
 """).strip()
 
+# Shared across requests; the OpenAI client only reads message dicts.
+_SYSTEM_MSG = {"role": "system", "content": SYSTEM_PROMPT}
+
 
 # --------------------------------------------------------------------------- #
 # AST-level security validator                                                 #
@@ -114,63 +128,250 @@ _FORBIDDEN_ATTRS = frozenset({
 })
 
 
-class _ASTValidator(ast.NodeVisitor):
-    """Walk the AST and raise ValueError on any disallowed construct."""
-
-    def generic_visit(self, node: ast.AST) -> None:
-        if type(node) not in _ALLOWED_NODE_TYPES:
-            raise ValueError(
-                f"Disallowed AST node: {type(node).__name__}. "
-                "Only pure pandas/numpy expressions are permitted."
-            )
-        super().generic_visit(node)
-
-    def visit_Name(self, node: ast.Name) -> None:
-        if node.id not in _ALLOWED_NAMES:
-            raise ValueError(
-                f"Disallowed name '{node.id}'. "
-                "Only 'df', 'pd', 'np', and standard builtins are allowed."
-            )
-        self.generic_visit(node)
-
-    def visit_Attribute(self, node: ast.Attribute) -> None:
-        if node.attr in _FORBIDDEN_ATTRS:
-            raise ValueError(
-                f"Forbidden attribute '.{node.attr}' — not permitted in data queries."
-            )
-        self.generic_visit(node)
-
-    def visit_Call(self, node: ast.Call) -> None:
-        if isinstance(node.func, ast.Name) and node.func.id not in _ALLOWED_NAMES:
-            raise ValueError(
-                f"Disallowed call '{node.func.id}()'. "
-                "Only whitelisted functions are permitted."
-            )
-        self.generic_visit(node)
+# Builtins exposed to eval(); a read-only proxy so queries cannot alter it.
+_SAFE_BUILTINS = types.MappingProxyType({
+    "len": len, "range": range, "list": list, "dict": dict,
+    "set": set, "tuple": tuple, "str": str, "int": int,
+    "float": float, "bool": bool, "round": round, "abs": abs,
+    "min": min, "max": max, "sum": sum, "sorted": sorted,
+    "enumerate": enumerate, "zip": zip, "print": print,
+    "True": True, "False": False, "None": None,
+})
 
 
 def _validate_ast(code: str) -> None:
     """
     Parse `code` as a Python expression and walk the AST.
     Raises ValueError with a descriptive message on any violation.
+
+    One depth-first pass over an explicit stack, reading child nodes
+    straight from `_fields` (several times faster than ast.walk's
+    generators), with an exact-type dispatch for the three node kinds that
+    need more than the node-type whitelist.
     """
     try:
         tree = ast.parse(code, mode="eval")
     except SyntaxError as exc:
         raise ValueError(f"Invalid Python expression: {exc}") from exc
-    _ASTValidator().visit(tree)
+
+    stack: list[ast.AST] = [tree]
+    push = stack.append
+    while stack:
+        node = stack.pop()
+        node_type = type(node)
+        if node_type is ast.Name:
+            if node.id not in _ALLOWED_NAMES:
+                raise ValueError(
+                    f"Disallowed name '{node.id}'. "
+                    "Only 'df', 'pd', 'np', and standard builtins are allowed."
+                )
+        elif node_type is ast.Attribute:
+            if node.attr in _FORBIDDEN_ATTRS:
+                raise ValueError(
+                    f"Forbidden attribute '.{node.attr}' — not permitted in data queries."
+                )
+        elif node_type is ast.Call:
+            func = node.func
+            if type(func) is ast.Name and func.id not in _ALLOWED_NAMES:
+                raise ValueError(
+                    f"Disallowed call '{func.id}()'. "
+                    "Only whitelisted functions are permitted."
+                )
+        elif node_type not in _ALLOWED_NODE_TYPES:
+            raise ValueError(
+                f"Disallowed AST node: {node_type.__name__}. "
+                "Only pure pandas/numpy expressions are permitted."
+            )
+
+        for field in node._fields:
+            child = getattr(node, field, None)
+            if type(child) is list:
+                for item in child:
+                    if isinstance(item, ast.AST):
+                        push(item)
+            elif isinstance(child, ast.AST):
+                push(child)
+
+
+@functools.lru_cache(maxsize=512)
+def _compile_validated(code: str) -> types.CodeType:
+    """
+    Validate `code` and compile it to an eval-mode code object.
+    Validation is a pure function of the string, so repeated queries reuse
+    the cached code object and skip both the AST walk and compile().
+    """
+    _validate_ast(code)
+    return compile(code, "<query>", "eval")
+
+
+# The plan shape the model emits most often: df.groupby("k")["m"].<agg>(),
+# usually followed by sort_values/head. It is answered from cached group
+# codes with NumPy scatter-reductions instead of a fresh pandas groupby.
+_GROUPED_AGGS = frozenset({"sum", "mean", "min", "max", "count"})
+
+
+@functools.lru_cache(maxsize=512)
+def _grouped_plan(code: str) -> tuple[types.CodeType, str, str, str] | None:
+    """
+    If validated `code` uses df only in one df.groupby("k")["m"].agg() call,
+    return (the rest of the expression compiled with that call replaced by
+    the name `grouped`, k, m, agg). Otherwise None.
+    """
+    tree = ast.parse(code, mode="eval")
+    if sum(type(n) is ast.Name and n.id == "df" for n in ast.walk(tree)) != 1:
+        return None
+    for node in ast.walk(tree):
+        if not (type(node) is ast.Call and not node.args and not node.keywords
+                and type(node.func) is ast.Attribute and node.func.attr in _GROUPED_AGGS):
+            continue
+        selection = node.func.value
+        if not (type(selection) is ast.Subscript and type(selection.value) is ast.Call):
+            continue
+        groupby = selection.value
+        if not (type(groupby.func) is ast.Attribute and groupby.func.attr == "groupby"
+                and type(groupby.func.value) is ast.Name and groupby.func.value.id == "df"
+                and len(groupby.args) == 1 and not groupby.keywords):
+            continue
+        key, value = groupby.args[0], selection.slice
+        if not all(type(n) is ast.Constant and type(n.value) is str for n in (key, value)):
+            return None
+
+        class _Replace(ast.NodeTransformer):
+            def visit_Call(self, call):
+                if call is node:
+                    return ast.copy_location(ast.Name(id="grouped", ctx=ast.Load()), call)
+                return self.generic_visit(call)
+
+        rest = ast.fix_missing_locations(_Replace().visit(tree))
+        return compile(rest, "<query>", "eval"), key.value, value.value, node.func.attr
+    return None
+
+
+def _grouped_reduce(
+    codes: np.ndarray, labels: pd.Index, values: pd.Series, agg: str
+) -> pd.Series | None:
+    """
+    values.groupby(keys).<agg>() from the keys' sorted group codes (-1 =
+    missing key) and labels, matching pandas' result dtypes. None for value
+    columns the fast path does not handle (anything but int64/float64).
+    """
+    if values.dtype not in (np.int64, np.float64):
+        return None
+    vals = values.to_numpy()
+    n = len(labels)
+    present = codes >= 0
+    rows = np.bincount(codes[present], minlength=n)
+    is_float = vals.dtype.kind == "f"
+    valid = present & ~np.isnan(vals) if is_float else present
+    c, v = codes[valid], vals[valid]
+    count = np.bincount(c, minlength=n)
+
+    if agg == "count":
+        out = count.astype(np.int64)
+    elif agg in ("sum", "mean"):
+        if is_float:
+            total = np.bincount(c, weights=v, minlength=n)
+        else:
+            total = np.zeros(n, dtype=np.int64)
+            np.add.at(total, c, v)
+        if agg == "sum":
+            out = total
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out = total / count
+    else:
+        reduce = np.maximum if agg == "max" else np.minimum
+        if is_float:
+            acc = np.full(n, -np.inf if agg == "max" else np.inf)
+            reduce.at(acc, c, v)
+            out = np.where(count > 0, acc, np.nan)
+        else:
+            info = np.iinfo(np.int64)
+            out = np.full(n, info.min if agg == "max" else info.max, dtype=np.int64)
+            reduce.at(out, c, v)
+
+    # Categorical keys keep only observed categories, like groupby's default
+    observed = rows > 0
+    return pd.Series(out[observed], index=labels[observed], name=values.name)
+
+
+# --------------------------------------------------------------------------- #
+# Streaming                                                                    #
+# --------------------------------------------------------------------------- #
+
+class _JSONObjectScanner:
+    """Incrementally tracks brace depth to spot the end of a JSON object."""
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.opened = False
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text: str) -> bool:
+        """Consume `text`; return True once the top-level object has closed."""
+        for ch in text:
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = self.opened
+            elif ch == "{":
+                self.depth += 1
+                self.opened = True
+            elif ch == "}" and self.opened:
+                self.depth -= 1
+                if self.depth == 0:
+                    return True
+        return False
 
 
 # --------------------------------------------------------------------------- #
 # Agent                                                                        #
 # --------------------------------------------------------------------------- #
 
+class _FrameMemo:
+    """What QueryAgent remembers about one session DataFrame."""
+
+    __slots__ = ("lock", "results", "group_codes")
+
+    def __init__(self) -> None:
+        # Plans run in worker threads; this guards `results` and the
+        # in-place datetime conversions on the frame.
+        self.lock = threading.Lock()
+        # pandas_code → (result_data, result_type, table), in LRU order
+        self.results: OrderedDict[str, tuple[Any, str, Any]] = OrderedDict()
+        # (group key column, its dtype) → (sorted codes, labels)
+        self.group_codes: dict[tuple[str, str], tuple[np.ndarray, pd.Index]] = {}
+
+
 class QueryAgent:
     """NL → pandas via Gradient AI / Claude Sonnet 4.6, then safe AST-validated execution."""
 
+    PLAN_CACHE_SIZE = 1024
+    PLAN_CACHE_TTL = 600  # seconds
+    RESULT_CACHE_SIZE = 64  # evaluated plans kept per DataFrame
+    # Larger results are not kept: a filter on a big upload would otherwise
+    # pin copies of the frame outside the session memory budget.
+    RESULT_CACHE_MAX_ROWS = 1000
+
     def __init__(self, client: AsyncOpenAI, model: str) -> None:
         self.client = client
         self.model = model
+        # sha256(schema_summary, question) → parsed LLM plan. The key covers
+        # everything the model is shown, so a hit skips the Gradient call.
+        self._plan_cache: TTLCache[str, dict] = TTLCache(
+            maxsize=self.PLAN_CACHE_SIZE, ttl=self.PLAN_CACHE_TTL
+        )
+        # id(session df) → memo of evaluated plans and group codes. The only
+        # edits to a session frame are deferred datetime conversions, which
+        # clear its memo; otherwise entries live until the frame is collected.
+        self._memos: dict[int, _FrameMemo] = {}
+        self._memos_lock = threading.Lock()
 
     # ---------------------------------------------------------------------- #
     # Public API                                                               #
@@ -181,23 +382,84 @@ class QueryAgent:
         question: str,
         df: pd.DataFrame,
         schema_summary: str,
+        datetime_formats: dict[str, str] | None = None,
     ) -> dict[str, Any]:
         """
         Returns:
         {
             answer_summary, pandas_code, result_type,
-            result_data, suggested_chart,
+            result_data, result_frame, suggested_chart,
             chart_x_col, chart_y_col, error
         }
+
+        `result_frame` is the tabular result as a DataFrame (None for
+        scalars/lists) so the Viz Agent can work on it column-wise.
+
+        Plans that run cleanly are cached for PLAN_CACHE_TTL seconds, and
+        their evaluated results per DataFrame, so a repeated question on the
+        same session needs neither an LLM call nor a pandas run.
+
+        `datetime_formats` maps still-unparsed date columns to their format
+        (see IngestAgent.ingest); referenced columns are converted in place
+        on `df` and removed from the mapping, so each is parsed at most once.
         """
-        user_msg = f"Dataset schema:\n{schema_summary}\n\nQuestion: {question}"
-        raw = await self._call_llm(user_msg)
+        result: dict[str, Any] = {}
+        async for event, payload in self.query_stream(
+            question, df, schema_summary, datetime_formats
+        ):
+            if event == "result":
+                result = payload
+        return result
+
+    async def query_stream(
+        self,
+        question: str,
+        df: pd.DataFrame,
+        schema_summary: str,
+        datetime_formats: dict[str, str] | None = None,
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """
+        Like `query`, but yields `("token", text)` for each piece of the LLM
+        reply as it arrives, then one `("result", dict)` with the dict `query`
+        returns. A cached plan yields the result alone.
+        """
+        key = hashlib.sha256(
+            f"{schema_summary}\x00{question}".encode()
+        ).hexdigest()
+        plan = cached = self._plan_cache.get(key)
+        if plan is None:
+            user_msg = f"Dataset schema:\n{schema_summary}\n\nQuestion: {question}"
+            parts: list[str] = []
+            async with aclosing(self._stream_llm(user_msg)) as deltas:
+                async for delta in deltas:
+                    parts.append(delta)
+                    yield "token", delta
+            raw = "".join(parts)
+            try:
+                plan = self._parse(raw)
+            except Exception as exc:
+                yield "result", self._err(f"LLM parse error: {exc}", raw)
+                return
+
+        # Evaluation is CPU-bound pandas work: keep it off the event loop
+        result = await anyio.to_thread.run_sync(self._run, plan, df, datetime_formats)
+        # Only plans that ran cleanly are replayed; a failed one gets a fresh
+        # LLM sample next time
+        if cached is None and result["error"] is None:
+            self._plan_cache[key] = plan
+        yield "result", result
 
-        try:
-            plan = self._parse(raw)
-        except Exception as exc:
-            return self._err(f"LLM parse error: {exc}", raw)
+    # ---------------------------------------------------------------------- #
+    # Private helpers                                                          #
+    # ---------------------------------------------------------------------- #
 
+    def _run(
+        self,
+        plan: dict,
+        df: pd.DataFrame,
+        datetime_formats: dict[str, str] | None,
+    ) -> dict[str, Any]:
+        """Evaluate a parsed plan's pandas_code on `df` (memoised per frame)."""
         code = plan.get("pandas_code") or "None"
         if code == "None":
             return {
@@ -205,51 +467,144 @@ class QueryAgent:
                 "pandas_code": code,
                 "result_type": "scalar",
                 "result_data": None,
+                "result_frame": None,
                 "suggested_chart": "none",
                 "chart_x_col": None,
                 "chart_y_col": None,
                 "error": None,
             }
 
-        try:
-            result_data, result_type = self._execute(code, df)
-        except Exception as exc:
-            return self._err(f"Execution error: {exc}", code)
+        memo = self._memo_for(df)
+        with memo.lock:
+            cached = memo.results.get(code)
+            if cached is not None:
+                memo.results.move_to_end(code)
+            else:
+                try:
+                    if datetime_formats and self._materialise_datetimes(
+                        code, df, datetime_formats
+                    ):
+                        # Results computed before the conversion (e.g. on
+                        # df.dtypes) no longer describe the frame.
+                        memo.results.clear()
+                        memo.group_codes.clear()
+                except Exception as exc:
+                    return self._err(f"Execution error: {exc}", code)
+                # Evaluate a snapshot outside the lock, so concurrent plans
+                # on one session run in parallel.
+                frame = df.copy(deep=False)
+
+        if cached is not None:
+            result_data, result_type, table = cached
+        else:
+            try:
+                result = self._evaluate(code, frame, memo)
+                table = self._table(result)
+                result_data, result_type = self._serialise(
+                    result if table is None else table
+                )
+            except Exception as exc:
+                return self._err(f"Execution error: {exc}", code)
+            if table is None or len(table) <= self.RESULT_CACHE_MAX_ROWS:
+                with memo.lock:
+                    memo.results[code] = (result_data, result_type, table)
+                    if len(memo.results) > self.RESULT_CACHE_SIZE:
+                        memo.results.popitem(last=False)
 
         return {
             "answer_summary": plan.get("answer_summary", ""),
             "pandas_code": code,
             "result_type": result_type,
             "result_data": result_data,
+            "result_frame": table,
             "suggested_chart": plan.get("suggested_chart", "none"),
             "chart_x_col": plan.get("chart_x_col"),
             "chart_y_col": plan.get("chart_y_col"),
             "error": None,
         }
 
-    # ---------------------------------------------------------------------- #
-    # Private helpers                                                          #
-    # ---------------------------------------------------------------------- #
-
-    async def _call_llm(self, user_msg: str) -> str:
-        resp = await self.client.chat.completions.create(
+    async def _stream_llm(self, user_msg: str) -> AsyncIterator[str]:
+        # The plan is a small JSON object: stream it and stop reading as soon
+        # as the top-level object closes instead of waiting for end-of-stream.
+        stream = await self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user",   "content": user_msg},
-            ],
+            messages=[_SYSTEM_MSG, {"role": "user", "content": user_msg}],
             temperature=0.1,
-            max_tokens=1024,
+            max_tokens=384,
+            response_format={"type": "json_object"},
+            stream=True,
         )
-        return resp.choices[0].message.content or ""
+        scanner = _JSONObjectScanner()
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content or ""
+                if delta:
+                    yield delta
+                if scanner.feed(delta):
+                    break
+        finally:
+            await stream.close()
+
+    def _memo_for(self, df: pd.DataFrame) -> _FrameMemo:
+        key = id(df)
+        with self._memos_lock:
+            memo = self._memos.get(key)
+            if memo is None:
+                memo = self._memos[key] = _FrameMemo()
+                weakref.finalize(df, self._memos.pop, key, None)
+        return memo
+
+    def _group_codes(
+        self, memo: _FrameMemo, df: pd.DataFrame, key: str
+    ) -> tuple[np.ndarray, pd.Index]:
+        """Sorted group codes (-1 = missing key) and labels for `key`, cached in `memo`."""
+        keys = df[key]
+        # Keyed by dtype too: `df` may be a snapshot taken before a
+        # concurrent datetime conversion, whose codes must not be reused.
+        # A single get/set keeps this safe against memo.group_codes.clear().
+        cache_key = (key, str(keys.dtype))
+        cached = memo.group_codes.get(cache_key)
+        if cached is None:
+            if isinstance(keys.dtype, pd.CategoricalDtype):
+                codes = keys.cat.codes.to_numpy()
+                labels = pd.CategoricalIndex(
+                    keys.cat.categories, categories=keys.cat.categories,
+                    ordered=keys.cat.ordered, name=key,
+                )
+            else:
+                codes, uniques = pd.factorize(keys, sort=True)
+                labels = pd.Index(uniques, name=key)
+            cached = memo.group_codes[cache_key] = (codes, labels)
+        return cached
 
     def _parse(self, raw: str) -> dict:
         raw = raw.strip()
-        raw = re.sub(r"^```(?:json)?\s*", "", raw)
-        raw = re.sub(r"\s*```$", "", raw)
-        return json.loads(raw)
+        if raw.startswith("```"):
+            raw = raw.split("\n", 1)[1] if "\n" in raw else raw[3:]
+        if raw.endswith("```"):
+            raw = raw[:-3]
+        return json.loads(raw.strip())
+
+    def _materialise_datetimes(
+        self, code: str, df: pd.DataFrame, datetime_formats: dict[str, str]
+    ) -> list[str]:
+        """Convert the date columns `code` mentions in place; return their names."""
+        converted = [c for c in datetime_formats if c in code]
+        for col in converted:
+            df[col] = pd.to_datetime(
+                df[col], format=datetime_formats.pop(col), errors="coerce", cache=True
+            )
+        return converted
 
     def _execute(self, code: str, df: pd.DataFrame) -> tuple[Any, str]:
+        """Evaluate `code` and return its JSON-ready (result_data, result_type)."""
+        return self._serialise(self._evaluate(code, df))
+
+    def _evaluate(
+        self, code: str, df: pd.DataFrame, memo: _FrameMemo | None = None
+    ) -> Any:
         """
         Safely evaluate a pandas expression.
 
@@ -257,39 +612,68 @@ class QueryAgent:
         1. AST parse + whitelist walk — blocks attribute traversal attacks,
            __class__.__bases__ chains, import statements, etc.
         2. Restricted builtins namespace (belt-and-suspenders).
-        3. Fresh df copy so mutations don't affect the stored dataset.
+        3. Shallow df copy: under Copy-on-Write any mutation copies the
+           touched data, so the stored dataset is never modified and no
+           column data is copied up front.
+
+        A single-column groupby aggregation is reduced with NumPy over
+        group codes cached in `memo` (by default `df`'s own; see
+        _grouped_plan) instead of pandas.
         """
         # Step 1: AST validation — raises ValueError on any violation
-        _validate_ast(code)
+        compiled = _compile_validated(code)
+
+        grouped = _grouped_plan(code)
+        if grouped is not None:
+            rest, key, value, agg = grouped
+            if df.columns.is_unique and key in df.columns and value in df.columns:
+                codes, labels = self._group_codes(memo or self._memo_for(df), df, key)
+                series = _grouped_reduce(codes, labels, df[value], agg)
+                if series is not None:
+                    return eval(rest, {  # noqa: S307 — rest of a validated plan
+                        "__builtins__": _SAFE_BUILTINS,
+                        "grouped": series, "pd": pd, "np": np,
+                    })
 
         # Step 2: Minimal explicit namespace
-        safe_builtins = {
-            "len": len, "range": range, "list": list, "dict": dict,
-            "set": set, "tuple": tuple, "str": str, "int": int,
-            "float": float, "bool": bool, "round": round, "abs": abs,
-            "min": min, "max": max, "sum": sum, "sorted": sorted,
-            "enumerate": enumerate, "zip": zip, "print": print,
-            "True": True, "False": False, "None": None,
-        }
         ns = {
-            "__builtins__": safe_builtins,
-            "df": df.copy(),
+            "__builtins__": _SAFE_BUILTINS,
+            "df": df.copy(deep=False),
             "pd": pd,
             "np": np,
         }
 
         # Step 3: Execute — AST validation already blocked dangerous paths
-        result = eval(code, ns)  # noqa: S307 — guarded by AST validation above
-        return self._serialise(result)
+        try:
+            return eval(compiled, ns)  # noqa: S307 — guarded by AST validation above
+        except TypeError:
+            # Text stored as `category` (see IngestAgent._compact_categoricals)
+            # rejects new values, e.g. fillna('Unknown'), and min/max since
+            # it is unordered. Retry with those columns as plain strings.
+            plain = {
+                col: dtype.categories.dtype
+                for col, dtype in df.dtypes.items()
+                if isinstance(dtype, pd.CategoricalDtype)
+            }
+            if not plain:
+                raise
+            ns["df"] = df.astype(plain)
+            return eval(compiled, ns)  # noqa: S307
 
-    def _serialise(self, result: Any) -> tuple[Any, str]:
+    def _table(self, result: Any) -> pd.DataFrame | None:
+        """Tabular view of a result: DataFrames as-is, Series reset to columns."""
         if isinstance(result, pd.DataFrame):
-            result = result.replace({np.nan: None})
-            return result.to_dict(orient="records"), "table"
+            return result
         if isinstance(result, pd.Series):
-            df_out = result.replace({np.nan: None}).reset_index()
+            df_out = result.reset_index()
             df_out.columns = [str(c) for c in df_out.columns]
-            return df_out.to_dict(orient="records"), "table"
+            return df_out
+        return None
+
+    def _serialise(self, result: Any) -> tuple[Any, str]:
+        table = self._table(result)
+        if table is not None:
+            return _records(table), "table"
         if isinstance(result, np.integer):
             return int(result), "scalar"
         if isinstance(result, np.floating):
@@ -306,6 +690,7 @@ class QueryAgent:
             "pandas_code": ctx,
             "result_type": "scalar",
             "result_data": None,
+            "result_frame": None,
             "suggested_chart": "none",
             "chart_x_col": None,
             "chart_y_col": None,
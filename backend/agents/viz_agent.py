@@ -10,6 +10,7 @@ from __future__ import annotations
 from typing import Any
 
 import numpy as np
+import pandas as pd
 
 
 SUPPORTED = {"bar", "line", "pie", "scatter", "area"}
@@ -19,7 +20,7 @@ class VizAgent:
 
     def generate(
         self,
-        result_data: list[dict] | Any,
+        result_data: list[dict] | pd.DataFrame | Any,
         result_type: str,
         suggested_chart: str,
         chart_x_col: str | None,
@@ -31,19 +32,36 @@ class VizAgent:
         {
             chart_type, data, x_key, y_keys, title, show_chart
         }
+
+        `result_data` may be the Query Agent's DataFrame, in which case column
+        typing and cleaning are done column-wise by pandas, or a list of row
+        dicts.
         """
-        if result_type == "scalar" or not isinstance(result_data, list) or not result_data:
+        if result_type == "scalar":
+            return self._none(answer_summary)
+        if isinstance(result_data, pd.DataFrame):
+            if result_data.empty:
+                return self._none(answer_summary)
+            cols = result_data.columns.tolist()
+            numeric_cols = set(result_data.select_dtypes(include="number").columns)
+        elif (
+            isinstance(result_data, list)
+            and result_data
+            and isinstance(result_data[0], dict)
+        ):
+            cols = list(result_data[0].keys())
+            numeric_cols = {c for c in cols if self._is_numeric(result_data, c)}
+        else:
             return self._none(answer_summary)
 
         chart_type = suggested_chart if suggested_chart in SUPPORTED else "none"
         if chart_type == "none":
-            chart_type = self._auto(result_data)
+            chart_type = self._auto(cols, numeric_cols)
         if chart_type == "none":
             return self._none(answer_summary)
 
-        cols = list(result_data[0].keys())
         x_key = chart_x_col if chart_x_col in cols else cols[0]
-        numeric = [c for c in cols if c != x_key and self._is_numeric(result_data, c)]
+        numeric = [c for c in cols if c != x_key and c in numeric_cols]
 
         if chart_y_col and chart_y_col in numeric:
             y_keys = [chart_y_col]
@@ -54,7 +72,11 @@ class VizAgent:
 
         return {
             "chart_type": chart_type,
-            "data": self._clean(result_data, x_key, y_keys),
+            "data": (
+                self._clean_frame(result_data, x_key, y_keys)
+                if isinstance(result_data, pd.DataFrame)
+                else self._clean(result_data, x_key, y_keys)
+            ),
             "x_key": x_key,
             "y_keys": y_keys,
             "title": answer_summary,
@@ -63,12 +85,10 @@ class VizAgent:
 
     # ---------------------------------------------------------------------- #
 
-    def _auto(self, data: list[dict]) -> str:
-        cols = list(data[0].keys())
+    def _auto(self, cols: list, numeric_cols: set) -> str:
         if len(cols) < 2:
             return "none"
-        numeric = [c for c in cols if self._is_numeric(data, c)]
-        return "bar" if numeric else "none"
+        return "bar" if numeric_cols else "none"
 
     def _is_numeric(self, data: list[dict], col: str) -> bool:
         vals = [r.get(col) for r in data[:10] if r.get(col) is not None]
@@ -77,21 +97,25 @@ class VizAgent:
     def _clean(
         self, data: list[dict], x_key: str | None, y_keys: list[str]
     ) -> list[dict]:
-        keep = {k for k in [x_key] + y_keys if k}
-        cleaned = []
-        for row in data:
-            entry: dict[str, Any] = {}
-            for k, v in row.items():
-                if k not in keep:
-                    continue
-                if isinstance(v, float) and v != v:  # NaN
-                    entry[k] = None
-                elif hasattr(v, "item"):              # numpy scalar
-                    entry[k] = v.item()
-                else:
-                    entry[k] = v
-            cleaned.append(entry)
-        return cleaned
+        keep = [k for k in (x_key, *y_keys) if k]
+        return [
+            {
+                k: (
+                    None if isinstance(v, float) and v != v       # NaN
+                    else v.item() if hasattr(v, "item")           # numpy scalar
+                    else v
+                )
+                for k in keep
+                if (v := row.get(k)) is not None or k in row
+            }
+            for row in data
+        ]
+
+    def _clean_frame(
+        self, df: pd.DataFrame, x_key: str, y_keys: list[str]
+    ) -> list[dict]:
+        sub = df[[x_key, *y_keys]]
+        return sub.astype(object).where(sub.notna(), None).to_dict(orient="records")
 
     def _none(self, title: str) -> dict[str, Any]:
         return {
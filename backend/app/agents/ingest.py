@@ -2,51 +2,199 @@
 Ingest Agent — parses CSV files, detects schema, stores in-memory dataset registry.
 Uses DigitalOcean Gradient™ AI inference to generate human-readable schema summaries.
 """
-import io
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import threading
 import uuid
+import weakref
+import numpy as np
 import pandas as pd
-from typing import Any
-from openai import OpenAI
+import pyarrow as pa
+from pyarrow import csv as pacsv
+from pyarrow import feather
+from typing import Any, BinaryIO
+from cachetools import LRUCache
 
 from app.config import settings, get_gradient_client
 
-# In-memory dataset store: { dataset_id: { "df": pd.DataFrame, "meta": DatasetMeta } }
-_dataset_store: dict[str, dict] = {}
+# Bounded stores shared by request handlers and worker threads. LRU eviction
+# caps resident DataFrames; every read-modify-write holds _store_lock.
+_store_lock = threading.RLock()
+
+# Rows kept in each dataset's precomputed preview (upload response shows the first 5)
+PREVIEW_ROWS = 10
+
+# Text columns with fewer distinct values than this share of rows become category
+_CATEGORY_MAX_RATIO = 0.5
+
+# Parsed datasets are spilled here as uncompressed Arrow IPC files
+_SPILL_DIR = os.path.join(tempfile.gettempdir(), "gradient-fisherman")
+
+# In-memory dataset store: { dataset_id: { "frame": StoredFrame, "meta": DatasetMeta } }
+_dataset_store: LRUCache = LRUCache(maxsize=128)
+
+# Content index: { blake2b(filename + bytes): dataset_id of the first upload }
+# Re-uploading an identical file shares that entry instead of re-parsing.
+_content_hash_index: LRUCache = LRUCache(maxsize=128)
+
+# AI schema summaries keyed on the prompt inputs: identical schemas reuse the answer
+_summary_cache: LRUCache = LRUCache(maxsize=128)
+
+# pandas' default NA markers, so Arrow-parsed frames see the same nulls as
+# pd.read_csv would
+_CSV_NULL_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+    "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a",
+    "nan", "null",
+]
+
+# Column names that suggest a date/time column
+_DATE_COL_RE = re.compile(r"date|time|created|updated", re.I)
+
+# Column-name keyword categories, checked in order (first match wins)
+_COLUMN_CATEGORIES = [
+    ("datetime", _DATE_COL_RE),
+    ("currency", re.compile(r"price|revenue|cost|amount|total|sale", re.I)),
+    ("identifier", re.compile(r"id|sku|code|ref", re.I)),
+    ("quantity", re.compile(r"qty|quantity|count|num|stock", re.I)),
+    ("label", re.compile(r"name|title|product|item|category", re.I)),
+]
 
 
 def _infer_column_description(col: str, dtype: str, sample_values: list) -> str:
     """Quick heuristic description for a column."""
-    col_lower = col.lower()
-    if any(k in col_lower for k in ["date", "time", "created", "updated"]):
-        return "datetime"
-    if any(k in col_lower for k in ["price", "revenue", "cost", "amount", "total", "sale"]):
-        return "currency"
-    if any(k in col_lower for k in ["id", "sku", "code", "ref"]):
-        return "identifier"
-    if any(k in col_lower for k in ["qty", "quantity", "count", "num", "stock"]):
-        return "quantity"
-    if any(k in col_lower for k in ["name", "title", "product", "item", "category"]):
-        return "label"
+    for category, pattern in _COLUMN_CATEGORIES:
+        if pattern.search(col):
+            return category
     return dtype
 
 
-def parse_csv(content: bytes, filename: str) -> dict:
+class StoredFrame:
+    """
+    A parsed dataset spilled to an uncompressed Arrow IPC file. Only the
+    column names, dtypes and row count stay resident; columns are
+    memory-mapped and converted to pandas on demand. Frames Arrow cannot
+    represent (duplicate labels, mixed-type object columns) stay in memory.
+    The file is removed once the last reference to the frame goes away.
+    """
+
+    def __init__(self, df: pd.DataFrame, path: str):
+        self.columns: list[str] = df.columns.tolist()
+        self.dtypes: pd.Series = df.dtypes
+        self.nrows = len(df)
+        # In-memory size after dtype compaction, reported with the dataset
+        self.memory_bytes = int(df.memory_usage(deep=True).sum())
+        self.path: str | None = None
+        self._df: pd.DataFrame | None = df
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowException, TypeError, ValueError):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        feather.write_feather(table, path, compression="uncompressed")
+        self.path = path
+        self._df = None
+        weakref.finalize(self, _remove_file, path)
+
+    def __len__(self) -> int:
+        return self.nrows
+
+    def to_pandas(self, columns: list[str] | None = None) -> pd.DataFrame:
+        """Materialise `columns` (default: all) as a DataFrame."""
+        if self._df is not None:
+            return self._df if columns is None else self._df[columns]
+        # An empty selection would read every column
+        table = feather.read_table(self.path, columns=columns or None, memory_map=True)
+        return table.to_pandas(date_as_object=False)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def parse_csv(file: BinaryIO, filename: str) -> dict:
     """
-    Parse CSV bytes into a DataFrame and register it.
+    Parse an uploaded CSV file into a DataFrame and register it.
     Returns dataset metadata dict.
     """
-    df = pd.read_csv(io.BytesIO(content))
-    
-    # Coerce date columns
-    for col in df.columns:
-        if any(k in col.lower() for k in ["date", "time", "created", "updated"]):
-            try:
-                df[col] = pd.to_datetime(df[col], errors="coerce")
-            except Exception:
-                pass
+    content_hash = await asyncio.to_thread(_content_hash, file, filename)
+    with _store_lock:
+        canonical_id = _content_hash_index.get(content_hash)
+        existing = _dataset_store.get(canonical_id) if canonical_id else None
+        if existing is not None:
+            dataset_id = str(uuid.uuid4())
+            # Share the entry by reference — the query path never mutates df
+            _dataset_store[dataset_id] = existing
+    if existing is not None:
+        return _upload_result(dataset_id, existing)
 
+    # Parsing and spilling are CPU/disk-bound; keep them off the event loop
     dataset_id = str(uuid.uuid4())
+    frame, schema_text, sample_values, preview = await asyncio.to_thread(
+        _load_frame, file, os.path.join(_SPILL_DIR, f"{dataset_id}.arrow")
+    )
+
+    # Generate AI schema summary via Gradient™ AI
+    schema_summary = await _generate_schema_summary(filename, frame, schema_text)
+    
+    # Per-dataset constants, built once instead of on every question/preview
+    schema_context = f"""Dataset: {filename}
+Rows: {len(frame)}
+Columns and types:
+{schema_text}
+
+Column names exactly: {frame.columns}"""
+    dataset = {
+        "frame": frame,
+        "filename": filename,
+        "schema_summary": schema_summary,
+        "schema_text": schema_text,
+        "schema_context": schema_context,
+        "sample_values": sample_values,
+        "preview_records": preview,
+    }
+    with _store_lock:
+        _dataset_store[dataset_id] = dataset
+        _content_hash_index[content_hash] = dataset_id
+    
+    return _upload_result(dataset_id, dataset)
+
+
+def _content_hash(file: BinaryIO, filename: str) -> str:
+    """blake2b of filename + file contents, read in 1 MiB chunks; rewinds `file`."""
+    hasher = hashlib.blake2b(filename.encode(), digest_size=16)
+    while chunk := file.read(1 << 20):
+        hasher.update(chunk)
+    file.seek(0)
+    return hasher.hexdigest()
+
+
+def _load_frame(
+    file: BinaryIO, path: str
+) -> tuple[StoredFrame, str, dict[str, list[str]], list[dict[str, Any]]]:
+    """
+    Parse a CSV file, spill the frame to `path`, and build the schema text,
+    per-column sample values and preview rows.
+    """
+    df = _read_csv(file)
     
+    # Coerce date columns (Arrow already types ISO dates/timestamps).
+    # cache=True parses each distinct date string once.
+    date_cols = [
+        c for c in df.columns
+        if _DATE_COL_RE.search(str(c)) and not pd.api.types.is_datetime64_any_dtype(df[c])
+    ]
+    for col in date_cols:
+        df[col] = pd.to_datetime(df[col], errors="coerce", cache=True)
+
+    _compact_categoricals(df)
+
     # Build schema summary
     schema_info = []
     sample_values = {}
@@ -57,61 +205,158 @@ def parse_csv(content: bytes, filename: str) -> dict:
         desc = _infer_column_description(col, dtype_str, samples)
         schema_info.append(f"- {col} ({desc}): {', '.join(str(s) for s in samples[:2])}")
 
-    schema_text = "\n".join(schema_info)
-    
-    # Generate AI schema summary via Gradient™ AI
-    schema_summary = _generate_schema_summary(filename, df, schema_text)
-    
-    _dataset_store[dataset_id] = {
-        "df": df,
-        "filename": filename,
-        "schema_summary": schema_summary,
-        "schema_text": schema_text,
-        "sample_values": sample_values,
-    }
-    
+    preview = head_records(df, PREVIEW_ROWS)
+    return StoredFrame(df, path), "\n".join(schema_info), sample_values, preview
+
+
+def _compact_categoricals(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Store low-cardinality text columns as `category`, so groupbys and filters
+    hash integer codes instead of strings and the spilled file stores each
+    label once. Numeric columns keep 64-bit dtypes: plan arithmetic such as
+    df["price"] * df["qty"] would silently wrap on narrower integers.
+    """
+    limit = _CATEGORY_MAX_RATIO * max(len(df), 1)
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        if df[col].nunique(dropna=True) < limit:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def _read_csv(file: BinaryIO) -> pd.DataFrame:
+    """
+    Parse a CSV file with Arrow's multithreaded reader, falling back to pandas
+    for dialects Arrow rejects. Columns keep the default numpy dtypes, and
+    empty cells and pandas' NA markers are null in every column, as with
+    pd.read_csv.
+    """
+    try:
+        table = pacsv.read_csv(
+            pa.PythonFile(file, mode="r"),
+            read_options=pacsv.ReadOptions(use_threads=True, block_size=1 << 20),
+            convert_options=pacsv.ConvertOptions(
+                null_values=_CSV_NULL_VALUES, strings_can_be_null=True
+            ),
+        )
+        # pandas renames duplicate headers (a, a.1); Arrow keeps them verbatim
+        if len(set(table.column_names)) != table.num_columns:
+            raise ValueError("duplicate column names")
+    except ValueError:  # includes pa.ArrowInvalid
+        file.seek(0)
+        return pd.read_csv(file)
+    # All-null columns become float64, as with pd.read_csv
+    for i, field in enumerate(table.schema):
+        if pa.types.is_null(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.float64()))
+    # `table` is the only reference, so with split_blocks self_destruct
+    # releases each column's Arrow buffers once pandas has copied it
+    return table.to_pandas(date_as_object=False, split_blocks=True, self_destruct=True)
+
+
+def head_records(df: pd.DataFrame, n: int, fill: Any = "") -> list[dict[str, Any]]:
+    """
+    First `n` rows as JSON-ready dicts with nulls replaced by `fill`.
+    All-numeric frames are converted column-wise in NumPy; others go through
+    Arrow (C++) instead of DataFrame.to_dict's per-cell loop. Frames Arrow
+    cannot represent (mixed-type object columns, duplicate labels) take the
+    pandas path.
+    """
+    head = df.head(n)
+    if head.columns.is_unique and all(
+        isinstance(d, np.dtype) and d.kind in "biuf" for d in head.dtypes
+    ):
+        return _numeric_records(head, fill)
+    try:
+        rows = pa.Table.from_pandas(head, preserve_index=False).to_pylist()
+    except (pa.ArrowException, TypeError, ValueError):
+        return head.fillna(fill).to_dict(orient="records")
+    return [{k: fill if v is None else v for k, v in row.items()} for row in rows]
+
+
+def _numeric_records(df: pd.DataFrame, fill: Any) -> list[dict[str, Any]]:
+    """Records for a frame of NumPy numeric columns; NaN becomes `fill`."""
+    values = []
+    for col in df.columns:
+        arr = df[col].to_numpy()
+        if arr.dtype.kind == "f":
+            mask = np.isnan(arr)
+            if mask.any():
+                arr = np.where(mask, None, arr)
+        values.append(arr.tolist())
+    cols = df.columns.tolist()
+    if fill is None:
+        return [dict(zip(cols, row)) for row in zip(*values)]
+    return [
+        {k: fill if v is None else v for k, v in zip(cols, row)}
+        for row in zip(*values)
+    ]
+
+
+def _upload_result(dataset_id: str, dataset: dict) -> dict:
+    """Build the upload response payload for a registered dataset."""
+    frame = dataset["frame"]
     return {
         "dataset_id": dataset_id,
-        "filename": filename,
-        "rows": len(df),
-        "columns": df.columns.tolist(),
-        "preview": df.head(5).fillna("").to_dict(orient="records"),
-        "schema_summary": schema_summary,
+        "filename": dataset["filename"],
+        "rows": len(frame),
+        "columns": frame.columns,
+        "preview": dataset["preview_records"][:5],
+        "schema_summary": dataset["schema_summary"],
+        "memory_bytes": frame.memory_bytes,
     }
 
 
-def _generate_schema_summary(filename: str, df: pd.DataFrame, schema_text: str) -> str:
+async def _generate_schema_summary(filename: str, frame: StoredFrame, schema_text: str) -> str:
     """Use Gradient™ AI to generate a friendly schema description."""
     try:
-        client = get_gradient_client()
-        prompt = f"""You are a data analyst assistant. A user uploaded a CSV file named "{filename}" with {len(df)} rows and {len(df.columns)} columns.
+        return await _ai_schema_summary(filename, schema_text, len(frame), len(frame.columns))
+    except Exception as e:
+        # Fallback summary if API unavailable
+        return (
+            f"Dataset '{filename}' with {len(frame)} rows and {len(frame.columns)} columns: "
+            f"{', '.join(frame.columns[:5])}{'...' if len(frame.columns) > 5 else ''}. "
+            "Ask questions about this data in plain English."
+        )
+
+
+async def _ai_schema_summary(filename: str, schema_text: str, n_rows: int, n_cols: int) -> str:
+    """
+    Gradient™ AI schema summary. The prompt depends only on these arguments,
+    so identical schemas reuse the answer. Errors propagate (and are not cached).
+    """
+    key = (filename, schema_text, n_rows, n_cols)
+    with _store_lock:
+        cached = _summary_cache.get(key)
+    if cached is not None:
+        return cached
+
+    client = get_gradient_client()
+    prompt = f"""You are a data analyst assistant. A user uploaded a CSV file named "{filename}" with {n_rows} rows and {n_cols} columns.
 
 Here are the columns and sample values:
 {schema_text}
 
 Write a 2-3 sentence friendly summary of what this dataset contains and what kinds of questions a business owner could ask about it. Be concise and practical."""
 
-        response = client.chat.completions.create(
-            model=settings.GRADIENT_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=200,
-            temperature=0.3,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        # Fallback summary if API unavailable
-        return (
-            f"Dataset '{filename}' with {len(df)} rows and {len(df.columns)} columns: "
-            f"{', '.join(df.columns.tolist()[:5])}{'...' if len(df.columns) > 5 else ''}. "
-            "Ask questions about this data in plain English."
-        )
+    response = await client.chat.completions.create(
+        model=settings.GRADIENT_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=200,
+        temperature=0.3,
+    )
+    summary = response.choices[0].message.content.strip()
+    with _store_lock:
+        _summary_cache[key] = summary
+    return summary
 
 
 def get_dataset(dataset_id: str) -> dict | None:
     """Retrieve a registered dataset by ID."""
-    return _dataset_store.get(dataset_id)
+    with _store_lock:
+        return _dataset_store.get(dataset_id)
 
 
 def list_datasets() -> list[str]:
     """List all registered dataset IDs."""
-    return list(_dataset_store.keys())
+    with _store_lock:
+        return list(_dataset_store.keys())
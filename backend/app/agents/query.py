@@ -2,14 +2,22 @@
 Query Agent — translates natural language questions into pandas operations
 using DigitalOcean Gradient™ AI inference, then executes them safely.
 """
-import json
-import traceback
+import ast
+import asyncio
+import hashlib
+import re
+import threading
+from functools import lru_cache
+from itertools import islice
 import pandas as pd
 import numpy as np
-from typing import Any, Optional
+from typing import Any, Optional, Sequence
+import orjson
+from cachetools import LRUCache
 
 from app.config import settings, get_gradient_client
-from app.agents.ingest import get_dataset
+from app.models import QueryPlan
+from app.agents.ingest import PREVIEW_ROWS, StoredFrame, get_dataset, head_records
 
 
 SYSTEM_PROMPT = """You are a data analysis expert. You help small business owners analyze their CSV data.
@@ -34,34 +42,152 @@ Example response:
 
 IMPORTANT: Respond ONLY with valid JSON. No markdown, no explanation outside the JSON."""
 
+# LLM plan cache: { key: QueryPlan }, LRU-evicted, guarded by _plan_lock.
+# Key = dataset schema fingerprint + normalized question + recent-history hash,
+# so a repeated question on the same data skips the Gradient™ AI round-trip.
+_plan_lock = threading.Lock()
+_plan_cache: LRUCache = LRUCache(maxsize=512)
+
+
+def _schema_fingerprint(frame: StoredFrame, filename: str) -> str:
+    """Cheap fingerprint of a dataset's shape: filename, columns, dtypes, row count."""
+    raw = (
+        filename
+        + "|".join(map(str, frame.columns))
+        + "|".join(map(str, frame.dtypes))
+        + str(len(frame))
+    )
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def _plan_cache_key(schema_fp: str, question: str, history: list[dict]) -> str:
+    normalized = re.sub(r"\s+", " ", question.strip().lower())
+    history_fp = hashlib.blake2b(
+        orjson.dumps(history, default=str, option=orjson.OPT_SORT_KEYS), digest_size=16
+    ).hexdigest()
+    return f"{schema_fp}:{history_fp}:{normalized}"
+
+
+_ALLOWED_NODES = frozenset({
+    ast.Expression, ast.Call, ast.Attribute, ast.Name, ast.Load, ast.Constant,
+    ast.BinOp, ast.Compare, ast.List, ast.Tuple, ast.Dict, ast.Slice, ast.Subscript,
+    ast.UnaryOp, ast.BoolOp, ast.keyword,
+    # Operator tokens hang off BinOp/Compare/UnaryOp/BoolOp as their own nodes
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.BitAnd, ast.BitOr, ast.Invert, ast.USub, ast.UAdd, ast.Not,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+    ast.And, ast.Or,
+})
+_ALLOWED_NAMES = frozenset({"df", "pd", "np"})
+
+# Methods that modify their object in place, rejected along with `inplace=`
+# and `**kwargs` (plans also run on a shallow copy of the frame).
+_MUTATING_METHODS = frozenset({
+    "pop", "insert", "update", "clear", "setdefault", "popitem", "append", "extend",
+})
+
+
+@lru_cache(maxsize=1024)
+def _compile_plan(code: str):
+    """
+    Validate a pandas expression against the AST whitelist and compile it.
+    Raises ValueError (or SyntaxError for non-expressions) on anything else.
+    """
+    tree = ast.parse(code, mode="eval")
+    for node in ast.walk(tree):
+        if type(node) not in _ALLOWED_NODES:
+            raise ValueError(f"Blocked operation: {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id not in _ALLOWED_NAMES:
+            raise ValueError(f"Blocked name: {node.id}")
+        if isinstance(node, ast.Attribute) and (
+            node.attr.startswith("_") or node.attr in _MUTATING_METHODS
+        ):
+            raise ValueError(f"Blocked attribute: {node.attr}")
+        if isinstance(node, ast.keyword) and node.arg == "inplace":
+            raise ValueError("Blocked operation: inplace")
+        if isinstance(node, ast.keyword) and node.arg is None:
+            # **{"inplace": True} would get past the check above
+            raise ValueError("Blocked operation: **kwargs")
+    return compile(tree, "<plan>", "eval")
+
+
+def _const_strings(node: ast.AST) -> list[str] | None:
+    """String literal(s) in `node` ("a" or ["a", "b"]), else None."""
+    elts = node.elts if isinstance(node, (ast.List, ast.Tuple)) else [node]
+    if all(isinstance(e, ast.Constant) and isinstance(e.value, str) for e in elts):
+        return [e.value for e in elts]
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _plan_columns(code: str) -> frozenset[str] | None:
+    """
+    Column names a plan reads, when every use of `df` is a plain column
+    access (df["a"], df[["a", "b"]], df.a) or a grouped selection
+    (df.groupby("a")["b"]). None means the plan touches the frame as a
+    whole and needs every column.
+    """
+    tree = ast.parse(code, mode="eval")
+    parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+    columns: set[str] = set()
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Name) and node.id == "df"):
+            continue
+        use = parents.get(node)
+        names = None
+        if isinstance(use, ast.Subscript) and use.value is node:
+            names = _const_strings(use.slice)
+        elif isinstance(use, ast.Attribute) and use.attr == "groupby":
+            call = parents.get(use)
+            selection = parents.get(call)
+            if (isinstance(call, ast.Call) and call.func is use and len(call.args) == 1
+                    and not call.keywords and isinstance(selection, ast.Subscript)
+                    and selection.value is call):
+                keys = _const_strings(call.args[0])
+                selected = _const_strings(selection.slice)
+                if keys is not None and selected is not None:
+                    names = keys + selected
+        elif isinstance(use, ast.Attribute) and not hasattr(pd.DataFrame, use.attr):
+            names = [use.attr]
+        if names is None:
+            return None
+        columns.update(names)
+    return frozenset(columns) or None
+
+
+def _load_plan_frame(frame: StoredFrame, code: str) -> pd.DataFrame:
+    """Materialise only the columns `code` references, or the whole frame."""
+    wanted = _plan_columns(code)
+    if wanted is None or not wanted <= set(frame.columns):
+        return frame.to_pandas()
+    # Selecting a duplicated label returns every column under it, so list it once
+    return frame.to_pandas(list(dict.fromkeys(c for c in frame.columns if c in wanted)))
+
 
 def _safe_eval_pandas(code: str, df: pd.DataFrame) -> Any:
     """
     Safely evaluate a pandas expression. Only allows DataFrame operations.
     Returns the result or raises an exception.
     """
-    # Sanitize: block dangerous patterns
-    blocked = ["import ", "exec(", "eval(", "open(", "__", "os.", "sys.", "subprocess"]
-    for b in blocked:
-        if b in code:
-            raise ValueError(f"Blocked operation: {b}")
-    
-    # Execute in restricted namespace
+    compiled = _compile_plan(code)
+
+    # Execute in restricted namespace on a shallow copy: under Copy-on-Write
+    # it copies no data, yet anything that slips past the mutation checks
+    # above cannot change the stored frame.
     namespace = {
-        "df": df.copy(),
+        "df": df.copy(deep=False),
         "pd": pd,
         "np": np,
     }
-    result = eval(code, {"__builtins__": {}}, namespace)
-    return result
+    return eval(compiled, {"__builtins__": {}}, namespace)
 
 
 def _result_to_table(result: Any) -> list[dict[str, Any]]:
     """Convert pandas result to JSON-serializable table."""
     if isinstance(result, pd.DataFrame):
-        return result.head(50).fillna("").to_dict(orient="records")
+        return head_records(result, 50)
     elif isinstance(result, pd.Series):
-        return result.reset_index().head(50).fillna("").to_dict(orient="records")
+        return head_records(result.head(50).reset_index(), 50)
     elif isinstance(result, (int, float, np.integer, np.floating)):
         return [{"value": float(result)}]
     else:
@@ -73,21 +199,74 @@ def _result_to_chart_data(result: Any, chart_type: str) -> tuple[list[dict], str
     if isinstance(result, pd.Series):
         df_chart = result.reset_index()
         df_chart.columns = ["name", "value"]
-        data = df_chart.head(20).fillna(0).to_dict(orient="records")
+        data = head_records(df_chart, 20, fill=0)
         return data, "name", ["value"]
     elif isinstance(result, pd.DataFrame):
         cols = result.columns.tolist()
         if len(cols) >= 2:
             # First col is x-axis, rest are y-axes
-            data = result.head(20).fillna(0).to_dict(orient="records")
+            data = head_records(result, 20, fill=0)
             return data, cols[0], cols[1:]
     return [], "name", ["value"]
 
 
-def answer_question(
+# Deterministic questions answered from dataset metadata without an LLM call.
+# Patterns match the whole question so "which columns drive revenue?" still
+# goes to the model.
+_ROWS_RE = re.compile(
+    r"how many (rows|records|entries)( are there)?( in (the|this|my) (data|dataset|file|csv))?"
+)
+_COLUMNS_RE = re.compile(
+    r"(what|which) columns( are there| does (it|the data|the dataset|this dataset) have)?"
+    r"|(list|show)( me)? (the |all )?columns"
+)
+_HEAD_RE = re.compile(r"(show|display|give)( me)? the (first (\d+) rows|head)( of the data)?")
+_DESCRIBE_RE = re.compile(r"(describe|summari[sz]e) (the |this |my )?(data|dataset|file)")
+
+
+async def _direct_answer(question: str, dataset: dict) -> dict | None:
+    """Answer trivial metadata questions locally; None means ask the LLM."""
+    q = re.sub(r"\s+", " ", question.strip().lower()).rstrip("?.! ")
+    frame = dataset["frame"]
+    table_data = None
+    if _ROWS_RE.fullmatch(q):
+        answer = f"Your dataset has {len(frame):,} rows."
+        code = "len(df)"
+    elif _COLUMNS_RE.fullmatch(q):
+        answer = f"Your dataset has {len(frame.columns)} columns: {', '.join(map(str, frame.columns))}."
+        code = "df.columns.tolist()"
+    elif m := _HEAD_RE.fullmatch(q):
+        n = min(int(m.group(4) or 5), 50)
+        if n <= PREVIEW_ROWS:
+            table_data = dataset["preview_records"][:n]
+        else:
+            table_data = await asyncio.to_thread(lambda: head_records(frame.to_pandas(), n))
+        answer = f"Here are the first {len(table_data)} rows of your data."
+        code = f"df.head({n})"
+    elif _DESCRIBE_RE.fullmatch(q):
+        numeric = [c for c, d in frame.dtypes.items() if pd.api.types.is_numeric_dtype(d)]
+        if not numeric:
+            return None
+        stats = await asyncio.to_thread(
+            lambda: frame.to_pandas(numeric).describe().round(2).rename_axis("statistic").reset_index()
+        )
+        table_data = _result_to_table(stats)
+        answer = f"Summary statistics for the {len(numeric)} numeric columns in your data."
+        code = "df.describe()"
+    else:
+        return None
+    return {
+        "answer": answer,
+        "table_data": table_data or None,
+        "chart": None,
+        "raw_code": code,
+    }
+
+
+async def answer_question(
     question: str,
     dataset_id: str,
-    conversation_history: list[dict],
+    conversation_history: Sequence[dict],
 ) -> dict:
     """
     Main query agent function. Returns:
@@ -107,23 +286,21 @@ def answer_question(
             "raw_code": None,
         }
     
-    df = dataset["df"]
-    schema_text = dataset["schema_text"]
-    filename = dataset["filename"]
-    
-    # Build context for the AI
-    schema_context = f"""Dataset: {filename}
-Rows: {len(df)}
-Columns and types:
-{schema_text}
+    direct = await _direct_answer(question, dataset)
+    if direct is not None:
+        return direct
 
-Column names exactly: {df.columns.tolist()}"""
+    frame = dataset["frame"]
+    filename = dataset["filename"]
+    schema_context = dataset["schema_context"]
 
     # Build conversation for multi-turn context
     messages = [{"role": "system", "content": SYSTEM_PROMPT}]
     
     # Add limited history
-    for msg in conversation_history[-6:]:  # last 3 turns
+    # last 3 turns; islice also works on the session deque without copying it
+    history_tail = list(islice(conversation_history, max(len(conversation_history) - 6, 0), None))
+    for msg in history_tail:
         if msg.get("role") in ("user", "assistant"):
             messages.append({"role": msg["role"], "content": msg["content"]})
     
@@ -137,27 +314,34 @@ Respond with JSON only."""
     
     messages.append({"role": "user", "content": user_prompt})
     
+    cache_key = _plan_cache_key(
+        _schema_fingerprint(frame, filename), question, history_tail
+    )
+    with _plan_lock:
+        plan = _plan_cache.get(cache_key)
+    
     try:
-        client = get_gradient_client()
-        response = client.chat.completions.create(
-            model=settings.GRADIENT_MODEL,
-            messages=messages,
-            max_tokens=500,
-            temperature=0.1,
-            response_format={"type": "json_object"},
-        )
+        if plan is None:
+            client = get_gradient_client()
+            response = await client.chat.completions.create(
+                model=settings.GRADIENT_MODEL,
+                messages=messages,
+                max_tokens=500,
+                temperature=0.1,
+                response_format={"type": "json_object"},
+            )
+            
+            raw_content = response.choices[0].message.content.strip()
+            plan = QueryPlan.model_validate_json(raw_content)
         
-        raw_content = response.choices[0].message.content.strip()
-        parsed = json.loads(raw_content)
-        
-        pandas_code = parsed.get("pandas_code", "")
-        answer_template = parsed.get("answer_template", "Here are the results: {result}")
-        suggest_chart = parsed.get("suggest_chart")
-        chart_title = parsed.get("chart_title", question[:50])
+        pandas_code = plan.pandas_code
+        answer_template = plan.answer_template
+        suggest_chart = plan.suggest_chart
+        chart_title = plan.chart_title or question[:50]
         
     except Exception as e:
         return {
-            "answer": f"I had trouble understanding that question. Could you rephrase it? (Error: {str(e)[:100]})",
+            "answer": f"I had trouble understanding that question. Could you rephrase it? (Error: {type(e).__name__})",
             "table_data": None,
             "chart": None,
             "raw_code": None,
@@ -165,7 +349,12 @@ Respond with JSON only."""
     
     # Execute the pandas code
     try:
-        result = _safe_eval_pandas(pandas_code, df)
+        result = await asyncio.to_thread(_run_plan, pandas_code, dataset)
+        
+        # Only plans that executed successfully are worth replaying
+        with _plan_lock:
+            _plan_cache[cache_key] = plan
+        
         table_data = _result_to_table(result)
         
         # Format answer
@@ -203,29 +392,174 @@ Respond with JSON only."""
         
     except Exception as e:
         # Fallback: try to answer descriptively
-        tb = traceback.format_exc()
         return {
-            "answer": _fallback_answer(question, df, str(e)),
+            "answer": await _fallback_answer(question, dataset, str(e)),
             "table_data": None,
             "chart": None,
             "raw_code": pandas_code,
         }
 
 
-def _fallback_answer(question: str, df: pd.DataFrame, error: str) -> str:
+def _run_plan(code: str, dataset: dict) -> Any:
+    """Validate `code`, load the columns it needs, and evaluate it."""
+    _compile_plan(code)  # reject bad plans before touching the file
+    frame = dataset["frame"]
+    grouped = _grouped_plan(code)
+    if grouped is not None:
+        rest, key, value, agg = grouped
+        if (len(set(frame.columns)) == len(frame.columns)
+                and key in frame.columns and value in frame.columns
+                and frame.dtypes[value] in (np.int64, np.float64)):
+            codes, labels = _group_codes(dataset, key)
+            values = frame.to_pandas([value])[value]
+            series = _grouped_reduce(codes, labels, values, agg)
+            if series is not None:
+                return eval(rest, {"__builtins__": {}}, {"grouped": series, "pd": pd, "np": np})
+    return _safe_eval_pandas(code, _load_plan_frame(frame, code))
+
+
+# Grouped fast path, as in agents.query_agent: df.groupby("k")["m"].<agg>()
+# plans are reduced with NumPy over group codes cached on the dataset.
+_GROUPED_AGGS = frozenset({"sum", "mean", "min", "max", "count"})
+
+
+@lru_cache(maxsize=1024)
+def _grouped_plan(code: str) -> tuple[Any, str, str, str] | None:
+    """
+    If `code` uses df only in one df.groupby("k")["m"].agg() call, return
+    (the rest of the expression compiled with that call replaced by the name
+    `grouped`, k, m, agg). Otherwise None.
+    """
+    tree = ast.parse(code, mode="eval")
+    if sum(isinstance(n, ast.Name) and n.id == "df" for n in ast.walk(tree)) != 1:
+        return None
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and not node.args and not node.keywords
+                and isinstance(node.func, ast.Attribute) and node.func.attr in _GROUPED_AGGS):
+            continue
+        selection = node.func.value
+        if not (isinstance(selection, ast.Subscript) and isinstance(selection.value, ast.Call)):
+            continue
+        groupby = selection.value
+        if not (isinstance(groupby.func, ast.Attribute) and groupby.func.attr == "groupby"
+                and isinstance(groupby.func.value, ast.Name) and groupby.func.value.id == "df"
+                and len(groupby.args) == 1 and not groupby.keywords):
+            continue
+        key, value = groupby.args[0], selection.slice
+        if not all(isinstance(n, ast.Constant) and isinstance(n.value, str) for n in (key, value)):
+            return None
+
+        class _Replace(ast.NodeTransformer):
+            def visit_Call(self, call):
+                if call is node:
+                    return ast.copy_location(ast.Name(id="grouped", ctx=ast.Load()), call)
+                return self.generic_visit(call)
+
+        rest = ast.fix_missing_locations(_Replace().visit(tree))
+        return compile(rest, "<plan>", "eval"), key.value, value.value, node.func.attr
+    return None
+
+
+def _group_codes(dataset: dict, key: str) -> tuple[np.ndarray, pd.Index]:
+    """Sorted group codes (-1 = missing key) and labels for `key`, cached per dataset."""
+    cache = dataset.setdefault("group_codes", {})
+    if key not in cache:
+        keys = dataset["frame"].to_pandas([key])[key]
+        if isinstance(keys.dtype, pd.CategoricalDtype):
+            codes = keys.cat.codes.to_numpy()
+            labels = pd.CategoricalIndex(
+                keys.cat.categories, categories=keys.cat.categories,
+                ordered=keys.cat.ordered, name=key,
+            )
+        else:
+            codes, uniques = pd.factorize(keys, sort=True)
+            labels = pd.Index(uniques, name=key)
+        cache[key] = (codes, labels)
+    return cache[key]
+
+
+def _grouped_reduce(
+    codes: np.ndarray, labels: pd.Index, values: pd.Series, agg: str
+) -> pd.Series | None:
+    """
+    values.groupby(keys).<agg>() from the keys' group codes and labels,
+    matching pandas' result dtypes; None unless values are int64/float64.
+    """
+    if values.dtype not in (np.int64, np.float64):
+        return None
+    vals = values.to_numpy()
+    n = len(labels)
+    present = codes >= 0
+    rows = np.bincount(codes[present], minlength=n)
+    is_float = vals.dtype.kind == "f"
+    valid = present & ~np.isnan(vals) if is_float else present
+    c, v = codes[valid], vals[valid]
+    count = np.bincount(c, minlength=n)
+
+    if agg == "count":
+        out = count.astype(np.int64)
+    elif agg in ("sum", "mean"):
+        if is_float:
+            total = np.bincount(c, weights=v, minlength=n)
+        else:
+            total = np.zeros(n, dtype=np.int64)
+            np.add.at(total, c, v)
+        if agg == "sum":
+            out = total
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out = total / count
+    else:
+        reduce = np.maximum if agg == "max" else np.minimum
+        if is_float:
+            acc = np.full(n, -np.inf if agg == "max" else np.inf)
+            reduce.at(acc, c, v)
+            out = np.where(count > 0, acc, np.nan)
+        else:
+            info = np.iinfo(np.int64)
+            out = np.full(n, info.min if agg == "max" else info.max, dtype=np.int64)
+            reduce.at(out, c, v)
+
+    observed = rows > 0  # categorical keys keep only observed categories
+    return pd.Series(out[observed], index=labels[observed], name=values.name)
+
+
+def _describe_text(df: pd.DataFrame) -> str:
+    """
+    Compact statistics for the fallback prompt: numeric describe() plus
+    nunique/top for the first few text columns. Skips describe(include="all"),
+    whose object branch hashes every text column only to be truncated away.
+    """
+    parts = []
+    numeric = df.select_dtypes(include="number")
+    if len(numeric.columns):
+        parts.append(numeric.describe().round(2).to_string())
+    for col in df.select_dtypes(include=["object", "string", "category"]).columns[:5]:
+        counts = df[col].value_counts()
+        top = counts.index[0] if len(counts) else None
+        parts.append(f"{col}: {len(counts)} unique, top={top}")
+    return "\n".join(parts)[:1000]
+
+
+async def _fallback_answer(question: str, dataset: dict, error: str) -> str:
     """Generate a helpful fallback answer when pandas execution fails."""
+    frame = dataset["frame"]
     try:
         client = get_gradient_client()
-        # Provide basic stats for the model to use
-        stats = df.describe(include="all").to_string()
-        response = client.chat.completions.create(
+        # Provide basic stats for the model to use (computed once per dataset)
+        stats = dataset.get("describe_text")
+        if stats is None:
+            stats = dataset["describe_text"] = await asyncio.to_thread(
+                lambda: _describe_text(frame.to_pandas())
+            )
+        response = await client.chat.completions.create(
             model=settings.GRADIENT_MODEL,
             messages=[{
                 "role": "user",
                 "content": f"""A user asked: "{question}"
 
 Dataset statistics:
-{stats[:1000]}
+{stats}
 
 Answer the question using only the statistics above. Be concise (2-3 sentences)."""
             }],
@@ -236,6 +570,6 @@ Answer the question using only the statistics above. Be concise (2-3 sentences).
     except Exception:
         return (
             f"I couldn't compute an exact answer for that question. "
-            f"Your dataset has {len(df)} rows and {len(df.columns)} columns. "
+            f"Your dataset has {len(frame)} rows and {len(frame.columns)} columns. "
             f"Try rephrasing your question or asking something simpler!"
         )
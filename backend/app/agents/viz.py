@@ -2,13 +2,14 @@
 Viz Agent — generates chart recommendations and configurations
 using DigitalOcean Gradient™ AI inference.
 """
-import json
 from typing import Any, Optional
+import orjson
 
 from app.config import settings, get_gradient_client
+from app.models import ChartRecommendation
 
 
-def recommend_chart(
+async def recommend_chart(
     question: str,
     data: list[dict[str, Any]],
     current_chart_type: Optional[str] = None,
@@ -33,7 +34,7 @@ def recommend_chart(
 
 Question: {question}
 Data keys: {keys}
-Sample rows: {json.dumps(sample, default=str)}
+Sample rows: {orjson.dumps(sample, default=str).decode()}
 Current chart type: {current_chart_type or 'none'}
 
 Respond with JSON:
@@ -44,7 +45,7 @@ Respond with JSON:
   "reasoning": "<one sentence>"
 }}"""
 
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=settings.GRADIENT_MODEL,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=150,
@@ -52,8 +53,8 @@ Respond with JSON:
             response_format={"type": "json_object"},
         )
         
-        result = json.loads(response.choices[0].message.content)
-        return result
+        content = response.choices[0].message.content
+        return ChartRecommendation.model_validate_json(content).model_dump()
     except Exception:
         # Heuristic fallback
         numeric_keys = [k for k in keys if k not in ("name", "index", "label", "category")]
@@ -67,7 +68,7 @@ Respond with JSON:
         }
 
 
-def generate_insight(
+async def generate_insight(
     question: str,
     data: list[dict[str, Any]],
     chart_type: str,
@@ -82,11 +83,11 @@ def generate_insight(
         client = get_gradient_client()
         prompt = f"""Given this {chart_type} chart data answering "{question}", write ONE sentence insight about the most interesting pattern or finding. Be specific with numbers if available.
 
-Data (first 5 rows): {json.dumps(data[:5], default=str)}
+Data (first 5 rows): {orjson.dumps(data[:5], default=str).decode()}
 
 Respond with just the insight sentence, no preamble."""
 
-        response = client.chat.completions.create(
+        response = await client.chat.completions.create(
             model=settings.GRADIENT_MODEL,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=100,
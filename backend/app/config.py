@@ -1,7 +1,7 @@
 """Configuration and Gradient™ AI client setup."""
 import os
 from functools import lru_cache
-from openai import OpenAI
+from openai import AsyncOpenAI
 from pydantic_settings import BaseSettings
 
 
@@ -29,10 +29,13 @@ def get_settings() -> Settings:
 settings = get_settings()
 
 
-def get_gradient_client() -> OpenAI:
+@lru_cache(maxsize=1)
+def get_gradient_client() -> AsyncOpenAI:
     """
     Returns an OpenAI-compatible client pointed at DigitalOcean Gradient™ AI.
     The Gradient™ AI platform is fully OpenAI SDK compatible.
+    Memoized: one client (and keep-alive connection pool) per process, so
+    TCP/TLS handshakes are amortized across LLM calls.
     """
     api_key = settings.GRADIENT_API_KEY
     if not api_key:
@@ -40,7 +43,7 @@ def get_gradient_client() -> OpenAI:
             "GRADIENT_API_KEY not set. Please add your DigitalOcean Gradient™ AI key to .env"
         )
     
-    return OpenAI(
+    return AsyncOpenAI(
         api_key=api_key,
         base_url=settings.GRADIENT_BASE_URL,
     )
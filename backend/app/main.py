@@ -2,12 +2,18 @@
 Gradient Fisherman — FastAPI Backend
 AI-powered SMB data assistant using DigitalOcean Gradient™ AI
 """
+import pandas as pd
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
 from app.routers import upload, chat
 
+# Copy-on-Write is always on from pandas 3.0; opt in on 2.x so the query
+# agent can evaluate against stored DataFrames without copying them.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
 app = FastAPI(
     title="Gradient Fisherman API",
     description="AI-powered data assistant for SMBs — powered by DigitalOcean Gradient™ AI",
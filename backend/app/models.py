@@ -1,6 +1,8 @@
 """Pydantic models for Gradient Fisherman API."""
-from typing import Any, Optional
-from pydantic import BaseModel
+from typing import Any, Literal, Optional, get_args
+from pydantic import BaseModel, ConfigDict, field_validator
+
+ChartType = Literal["bar", "line", "pie", "scatter", "area"]
 
 
 class ChatMessage(BaseModel):
@@ -14,6 +16,31 @@ class ChatRequest(BaseModel):
     dataset_id: Optional[str] = None
 
 
+class QueryPlan(BaseModel):
+    """Query plan the LLM returns for a question (see app.agents.query.SYSTEM_PROMPT)."""
+    model_config = ConfigDict(frozen=True)
+
+    pandas_code: str
+    answer_template: str = "Here are the results: {result}"
+    suggest_chart: Optional[ChartType] = None
+    chart_title: Optional[str] = None
+
+    @field_validator("suggest_chart", mode="before")
+    @classmethod
+    def _no_chart_for_unknown_type(cls, value: Any) -> Any:
+        # The model sometimes answers "none" or "table"; that means no chart,
+        # not an invalid plan
+        return value if value in get_args(ChartType) else None
+
+
+class ChartRecommendation(BaseModel):
+    """Chart choice the LLM returns from app.agents.viz.recommend_chart."""
+    chart_type: ChartType
+    x_key: str
+    y_keys: list[str]
+    reasoning: str = ""
+
+
 class ChartConfig(BaseModel):
     chart_type: str  # "bar" | "line" | "pie" | "scatter" | "area"
     title: str
@@ -37,6 +64,7 @@ class UploadResponse(BaseModel):
     columns: list[str]
     preview: list[dict[str, Any]]
     schema_summary: str
+    memory_bytes: int
 
 
 class DatasetInfo(BaseModel):
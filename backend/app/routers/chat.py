@@ -1,5 +1,8 @@
 """Chat router — handles conversational queries about uploaded datasets."""
+import threading
 import uuid
+from collections import deque
+from cachetools import TTLCache
 from fastapi import APIRouter, HTTPException
 from app.models import ChatRequest, ChatResponse
 from app.agents.query import answer_question
@@ -7,8 +10,11 @@ from app.agents.ingest import get_dataset
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
-# Simple in-memory session store: { session_id: [messages] }
-_sessions: dict[str, list[dict]] = {}
+# In-memory session store: { session_id: deque of the last 20 messages },
+# idle sessions expire
+HISTORY_MAX = 20
+_sessions_lock = threading.Lock()
+_sessions: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
 
 
 @router.post("/chat", response_model=ChatResponse)
@@ -20,7 +26,10 @@ async def chat(request: ChatRequest):
     session_id = request.session_id or str(uuid.uuid4())
     
     # Get or create session history
-    history = _sessions.get(session_id, [])
+    with _sessions_lock:
+        history = _sessions.get(session_id)
+        if history is None:
+            history = _sessions[session_id] = deque(maxlen=HISTORY_MAX)
     
     # Validate dataset exists if provided
     if request.dataset_id:
@@ -38,15 +47,12 @@ async def chat(request: ChatRequest):
     
     question = user_messages[-1].content
     
-    # Add to history
-    history.append({"role": "user", "content": question})
-    
-    # Answer the question
+    # Answer the question (history does not include it yet)
     if request.dataset_id:
-        result = answer_question(
+        result = await answer_question(
             question=question,
             dataset_id=request.dataset_id,
-            conversation_history=history[:-1],  # exclude current message
+            conversation_history=history,
         )
     else:
         # No dataset — provide helpful guidance
@@ -63,9 +69,11 @@ async def chat(request: ChatRequest):
     
     answer = result["answer"]
     
-    # Add assistant response to history
+    # Record the turn; the deque drops the oldest messages past HISTORY_MAX
+    history.append({"role": "user", "content": question})
     history.append({"role": "assistant", "content": answer})
-    _sessions[session_id] = history[-20:]  # keep last 20 messages
+    with _sessions_lock:
+        _sessions[session_id] = history  # refresh the TTL
     
     return ChatResponse(
         message=answer,
@@ -78,13 +86,16 @@ async def chat(request: ChatRequest):
 @router.get("/chat/{session_id}/history")
 async def get_history(session_id: str):
     """Get conversation history for a session."""
-    return {"session_id": session_id, "messages": _sessions.get(session_id, [])}
+    with _sessions_lock:
+        messages = list(_sessions.get(session_id, ()))
+    return {"session_id": session_id, "messages": messages}
 
 
 @router.delete("/chat/{session_id}")
 async def clear_session(session_id: str):
     """Clear conversation history for a session."""
-    _sessions.pop(session_id, None)
+    with _sessions_lock:
+        _sessions.pop(session_id, None)
     return {"status": "cleared", "session_id": session_id}
 
 
@@ -1,4 +1,5 @@
 """File upload router — handles CSV ingestion."""
+import tempfile
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from app.agents.ingest import parse_csv
 from app.config import settings
@@ -6,6 +7,8 @@ from app.config import settings
 router = APIRouter(prefix="/api", tags=["upload"])
 
 MAX_BYTES = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+CHUNK_BYTES = 1 << 20
+SPOOL_BYTES = 8 << 20  # uploads above this spill to a temp file
 
 
 @router.post("/upload")
@@ -17,22 +20,27 @@ async def upload_csv(file: UploadFile = File(...)):
     if not file.filename or not file.filename.lower().endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files are supported.")
     
-    content = await file.read()
-    
-    if len(content) > MAX_BYTES:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE_MB}MB."
-        )
-    
-    if len(content) == 0:
-        raise HTTPException(status_code=400, detail="File is empty.")
-    
-    try:
-        result = parse_csv(content, file.filename)
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=422, detail=f"Could not parse CSV: {str(e)}")
+    # Stream in chunks so an oversized upload is rejected before it is buffered
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as buf:
+        total = 0
+        while chunk := await file.read(CHUNK_BYTES):
+            total += len(chunk)
+            if total > MAX_BYTES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE_MB}MB."
+                )
+            buf.write(chunk)
+        
+        if total == 0:
+            raise HTTPException(status_code=400, detail="File is empty.")
+        buf.seek(0)
+        
+        try:
+            result = await parse_csv(buf, file.filename)
+            return result
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Could not parse CSV: {str(e)}")
 
 
 @router.get("/datasets/{dataset_id}/preview")
@@ -43,12 +51,13 @@ async def get_preview(dataset_id: str):
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found.")
     
-    df = dataset["df"]
+    frame = dataset["frame"]
     return {
         "dataset_id": dataset_id,
         "filename": dataset["filename"],
-        "rows": len(df),
-        "columns": df.columns.tolist(),
-        "preview": df.head(10).fillna("").to_dict(orient="records"),
+        "rows": len(frame),
+        "columns": frame.columns,
+        "preview": dataset["preview_records"],
         "schema_summary": dataset["schema_summary"],
+        "memory_bytes": frame.memory_bytes,
     }
@@ -5,36 +5,89 @@ SMB Data Assistant powered by DigitalOcean Gradient™ AI + Claude Sonnet 4.6
 
 from __future__ import annotations
 
-import io
+import asyncio
+import ctypes
+import functools
+import gc
+import logging
 import os
-import uuid
+import secrets
+import tempfile
+import time
+import weakref
+from contextlib import asynccontextmanager
 from typing import Any
 
+import anyio
 import pandas as pd
+import orjson
+import pyarrow as pa
+from pyarrow import feather
 from cachetools import TTLCache
 from dotenv import load_dotenv
 from fastapi import FastAPI, File, HTTPException, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from openai import AsyncOpenAI
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from agents import IngestAgent, QueryAgent, VizAgent
+from agents.ingest_agent import content_hasher
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # ── Config ─────────────────────────────────────────────────────────────────── #
 
 GRADIENT_API_KEY  = os.getenv("GRADIENT_API_KEY", "")
 GRADIENT_BASE_URL = os.getenv("GRADIENT_BASE_URL", "https://inference.do-ai.run/v1")
 GRADIENT_MODEL    = os.getenv("GRADIENT_MODEL", "claude-sonnet-4-6")
 
+MAX_UPLOAD_BYTES   = 50 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1 << 20
+SESSION_BYTES_BUDGET = 512 * 1024 * 1024
+SPILL_DIR          = os.path.join(tempfile.gettempdir(), "gradient-fisherman-sessions")
+REDIS_URL          = os.getenv("REDIS_URL", "")
+SESSION_TTL        = 1800  # 30 min
+MODELS_TTL         = 60  # seconds a /models listing is served from memory
+MAX_BATCH_QUESTIONS = 20
+BATCH_CONCURRENCY  = 8   # concurrent LLM calls per batch, to stay under rate limits
+# anyio's worker pool is shared by our offloaded pandas work and Starlette's
+# own sync I/O (spooled upload reads), so it is sized above the core count.
+WORKER_THREADS     = int(os.getenv("WORKER_THREADS", max(32, (os.cpu_count() or 1) * 4)))
+PREWARM_THREADS    = min(WORKER_THREADS, os.cpu_count() or 1)
+
+# Copy-on-Write is always on from pandas 3.0; opt in on 2.x so QueryAgent can
+# hand each query a shallow copy of the session frame.
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
+
 # ── App ────────────────────────────────────────────────────────────────────── #
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Parsing, spilling and chart building run in anyio's worker threads so
+    # they never block the event loop. Start a core's worth of them now so
+    # the first uploads don't pay for thread creation.
+    anyio.to_thread.current_default_thread_limiter().total_tokens = WORKER_THREADS
+    async with anyio.create_task_group() as tg:
+        for _ in range(PREWARM_THREADS):
+            # Overlapping sleeps force distinct threads; idle ones are reused.
+            tg.start_soon(anyio.to_thread.run_sync, time.sleep, 0.01)
+    yield
+    # Close the shared client's connection pool on shutdown
+    if _client is not None:
+        await _client.close()
+    if _redis is not None:
+        await _redis.aclose()
+
 app = FastAPI(
     title="Gradient Fisherman API",
     description="SMB Data Assistant — DigitalOcean Gradient™ AI Hackathon",
     version="1.0.0",
     docs_url="/docs",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -50,16 +103,87 @@ app.add_middleware(
 ingest_agent = IngestAgent()
 viz_agent    = VizAgent()
 
-# ── Session store: TTLCache (max 50 sessions, 30-min TTL) ─────────────────── #
-# Caps memory at 50 concurrent sessions; each auto-expires after 30 minutes.
-# Sessions are in-process only — lost on restart (acceptable for demo).
-# For production: replace with Redis or a persistent store.
+# ── Session store: TTLCache (512 MB budget, 30-min TTL) ───────────────────── #
+# Sized by resident DataFrame bytes rather than session count, so a few large
+# uploads evict older sessions instead of coexisting; each auto-expires after
+# 30 minutes.
+# With REDIS_URL set, every session is also written to Redis (see
+# _publish_session) and this cache becomes a per-worker L1, so any uvicorn
+# worker can serve any session and sessions survive restarts. Without it,
+# sessions are in-process only.
+# Uploaded frames are spilled to disk and only loaded on the first /query
+# (see _SpilledFrame), so idle sessions hold just their profile.
+
+def _session_bytes(session: dict) -> int:
+    df = session.get("df")
+    return 4096 + (int(df.memory_usage(deep=True).sum()) if df is not None else 0)
+
+# CPython frees a dropped frame's buffers, but glibc keeps the pages in its
+# arenas, so RSS would track the lifetime peak. Once a session holding a
+# loaded frame is evicted or deleted, collect any cycles and trim the heap.
+try:
+    _malloc_trim = ctypes.CDLL("libc.so.6").malloc_trim
+except (OSError, AttributeError):  # not glibc
+    _malloc_trim = None
+_trim_pending = False
+
+def _trim_heap() -> None:
+    global _trim_pending
+    _trim_pending = False
+    gc.collect()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+def _released(session: dict) -> None:
+    """Schedule a heap trim for after the caller drops `session`, if it held a frame."""
+    global _trim_pending
+    if session.get("df") is None or _trim_pending:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:  # not on the event loop
+        return
+    # A tick later the caller's reference is gone; the collection and trim
+    # then run on the default executor rather than blocking the loop.
+    loop.call_soon(loop.run_in_executor, None, _trim_heap)
+    _trim_pending = True
+
+class _SessionCache(TTLCache):
+    """TTLCache that releases memory for sessions it evicts or expires."""
+
+    def popitem(self):
+        key, session = super().popitem()
+        _released(session)
+        return key, session
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for _, session in expired:
+            _released(session)
+        return expired
+
+sessions: TTLCache = _SessionCache(
+    maxsize=SESSION_BYTES_BUDGET, ttl=SESSION_TTL, getsizeof=_session_bytes
+)
 
-sessions: TTLCache = TTLCache(maxsize=50, ttl=1800)  # 1800 s = 30 min
+def _store_session(session_id: str, session: dict) -> None:
+    """(Re)insert a session so the cache re-measures it; 413 if it alone exceeds the budget."""
+    try:
+        sessions[session_id] = session
+    except ValueError as exc:  # cachetools: value too large
+        sessions.pop(session_id, None)
+        raise HTTPException(413, "Dataset too large to keep in memory.") from exc
 
 # ── Helpers ────────────────────────────────────────────────────────────────── #
 
+# One client (and httpx connection pool) per process, created on first use so
+# keep-alive connections and TLS sessions are reused across requests.
+# QueryAgent holds no per-request state, so it is shared the same way.
+_client: AsyncOpenAI | None = None
+_query_agent: QueryAgent | None = None
+
 def _gradient_client() -> AsyncOpenAI:
+    global _client
     if not GRADIENT_API_KEY:
         raise HTTPException(
             status_code=503,
@@ -68,7 +192,147 @@ def _gradient_client() -> AsyncOpenAI:
                 "Add your DigitalOcean Gradient Model Access Key to the environment."
             ),
         )
-    return AsyncOpenAI(api_key=GRADIENT_API_KEY, base_url=GRADIENT_BASE_URL)
+    # No await between the check and the assignment, so this is race-free
+    # on the event loop without a lock.
+    if _client is None:
+        _client = AsyncOpenAI(api_key=GRADIENT_API_KEY, base_url=GRADIENT_BASE_URL)
+    return _client
+
+class _SpilledFrame:
+    """
+    A session DataFrame written to an LZ4-compressed Arrow IPC file. The file
+    is removed once the session holding it is deleted or evicted.
+    """
+
+    def __init__(self, table: pa.Table, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        feather.write_feather(table, path, compression="lz4")
+        self.path = path
+        weakref.finalize(self, _remove_file, path)
+
+    def load(self) -> pd.DataFrame:
+        return feather.read_table(self.path).to_pandas(self_destruct=True)
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+# Content digest → spill file of a live session. Re-uploads of the same bytes
+# share it; the file goes once the last session holding it is dropped.
+_spills: weakref.WeakValueDictionary[bytes, _SpilledFrame] = weakref.WeakValueDictionary()
+
+def _new_session(profile: dict) -> dict[str, Any]:
+    return {
+        "profile": profile,
+        # Per-session copy: entries are popped as columns get converted.
+        "datetime_formats": dict(profile["datetime_formats"]),
+    }
+
+def _session_entry(
+    session_id: str, profile: dict, df: pd.DataFrame, digest: bytes
+) -> dict:
+    """Session dict holding the frame spilled to disk, or in memory if Arrow can't encode it."""
+    session = _new_session(profile)
+    spill = _spills.get(digest)
+    if spill is None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowException, TypeError, ValueError):
+            session["df"] = df
+            return session
+        # Named after the session, not the digest, so two concurrent first
+        # uploads of the same bytes never share (and delete) one path.
+        spill = _SpilledFrame(table, os.path.join(SPILL_DIR, f"{session_id}.arrow"))
+        _spills[digest] = spill
+    session["spill"] = spill
+    return session
+
+# ── Shared session store (optional Redis) ──────────────────────────────────── #
+
+# A session is a Redis hash of its profile JSON and the LZ4 Arrow file bytes
+# already written by _SpilledFrame, expiring with the same 30-minute TTL.
+# Each access refreshes that TTL, and a worker drops its cached copy once the
+# key is gone. `redis` is only imported when REDIS_URL is configured.
+_redis = None
+
+def _redis_client():
+    global _redis
+    if _redis is None:
+        import redis.asyncio as aioredis
+
+        _redis = aioredis.from_url(REDIS_URL)
+    return _redis
+
+def _redis_key(session_id: str) -> str:
+    return f"gradient-fisherman:session:{session_id}"
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read()
+
+def _frame_from_bytes(data: bytes) -> pd.DataFrame:
+    return feather.read_table(pa.BufferReader(data)).to_pandas(self_destruct=True)
+
+async def _publish_session(session_id: str, session: dict) -> None:
+    """
+    Share a new session through Redis. Frames Arrow can't encode, and every
+    session while Redis is unreachable, stay worker-local.
+    """
+    spill = session.get("spill")
+    if not REDIS_URL or spill is None:
+        return
+    arrow = await anyio.to_thread.run_sync(_read_bytes, spill.path)
+    profile = orjson.dumps(session["profile"], option=orjson.OPT_SERIALIZE_NUMPY)
+    key = _redis_key(session_id)
+    try:
+        async with _redis_client().pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"profile": profile, "arrow": arrow})
+            pipe.expire(key, SESSION_TTL)
+            await pipe.execute()
+    # `redis` is imported lazily, so its RedisError can't be named here.
+    except Exception:
+        logger.warning("Redis unavailable; session %s stays worker-local", session_id, exc_info=True)
+        return
+    session["shared"] = True
+
+async def _touch_session(session_id: str) -> bool | None:
+    """
+    Refresh a shared session's Redis TTL. False once it has been deleted (by
+    any worker) or has expired; None if Redis can't be reached.
+    """
+    try:
+        return bool(await _redis_client().expire(_redis_key(session_id), SESSION_TTL))
+    except Exception:
+        logger.warning("Redis unavailable; serving session %s from this worker", session_id, exc_info=True)
+        return None
+
+async def _fetch_session(session_id: str) -> dict | None:
+    """Rebuild a session published by another worker (or before a restart)."""
+    if not REDIS_URL:
+        return None
+    try:
+        data = await _redis_client().hgetall(_redis_key(session_id))
+    except Exception as exc:
+        raise HTTPException(503, "Session store unavailable. Try again shortly.") from exc
+    if not data:
+        return None
+    profile = orjson.loads(data[b"profile"])
+    df = await anyio.to_thread.run_sync(_frame_from_bytes, data[b"arrow"])
+    return {
+        "profile": profile,
+        "datetime_formats": dict(profile["datetime_formats"]),
+        "df": df,
+        "shared": True,
+    }
+
+def _get_query_agent() -> QueryAgent:
+    global _query_agent
+    client = _gradient_client()
+    if _query_agent is None or _query_agent.client is not client:
+        _query_agent = QueryAgent(client=client, model=GRADIENT_MODEL)
+    return _query_agent
 
 # ── Schemas ────────────────────────────────────────────────────────────────── #
 
@@ -82,10 +346,21 @@ class QueryResponse(BaseModel):
     answer_summary: str
     pandas_code: str
     result_type: str
+    # Deliberately `Any`: pydantic passes it through without visiting rows,
+    # where a typed union would validate (and copy) every row dict and coerce
+    # bool scalars. Rows are already JSON-ready (see ingest_agent._records).
     result_data: Any
     chart: dict
     error: str | None
 
+class BatchQueryRequest(BaseModel):
+    session_id: str
+    questions: list[str] = Field(min_length=1, max_length=MAX_BATCH_QUESTIONS)
+
+class BatchQueryResponse(BaseModel):
+    session_id: str
+    results: list[QueryResponse]
+
 class UploadResponse(BaseModel):
     session_id: str
     filename: str
@@ -97,8 +372,13 @@ class UploadResponse(BaseModel):
 
 # ── Routes ─────────────────────────────────────────────────────────────────── #
 
+# Every JSON route declares a response model or return type, so FastAPI
+# serializes it straight to bytes in pydantic-core instead of going through
+# jsonable_encoder + json.dumps. (A custom default_response_class such as
+# ORJSONResponse would switch that fast path off.)
+
 @app.get("/")
-async def root():
+async def root() -> dict[str, str]:
     return {
         "service": "Gradient Fisherman API",
         "model":   GRADIENT_MODEL,
@@ -107,7 +387,7 @@ async def root():
     }
 
 @app.get("/health")
-async def health():
+async def health() -> dict[str, bool]:
     return {"ok": True}
 
 
@@ -117,20 +397,41 @@ async def upload_csv(file: UploadFile = File(...)):
     if not file.filename or not file.filename.lower().endswith(".csv"):
         raise HTTPException(400, "Only CSV files are supported.")
 
-    contents = await file.read()
+    # Read in chunks and enforce the cap as bytes arrive, so an oversized
+    # upload is rejected without ever being held in memory in full.
+    # The content hash is built as bytes arrive; re-uploads of the same file
+    # reuse its profile, parsed frame and spill file.
+    contents = bytearray()
+    hasher = content_hasher()
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        contents += chunk
+        if len(contents) > MAX_UPLOAD_BYTES:
+            raise HTTPException(413, "File too large (max 50 MB).")
+        hasher.update(chunk)
     if len(contents) == 0:
         raise HTTPException(400, "File is empty.")
-    if len(contents) > 50 * 1024 * 1024:
-        raise HTTPException(413, "File too large (max 50 MB).")
-
-    try:
-        profile = ingest_agent.ingest(contents, file.filename)
-    except ValueError as exc:
-        raise HTTPException(422, str(exc)) from exc
-
-    df = pd.read_csv(io.BytesIO(contents), nrows=100_000)
-    session_id = str(uuid.uuid4())
-    sessions[session_id] = {"profile": profile, "df": df}
+    digest = hasher.digest()
+    session_id = secrets.token_urlsafe(16)
+
+    # A live session already spilled these bytes: share its file and reuse
+    # the cached profile without parsing anything.
+    spill = _spills.get(digest)
+    profile = ingest_agent.cached_profile(digest, file.filename) if spill else None
+    if profile is not None:
+        entry = _new_session(profile)
+        entry["spill"] = spill
+    else:
+        try:
+            profile, df = await anyio.to_thread.run_sync(
+                ingest_agent.profile_and_frame, contents, file.filename, digest
+            )
+        except ValueError as exc:
+            raise HTTPException(422, str(exc)) from exc
+        entry = await anyio.to_thread.run_sync(
+            _session_entry, session_id, profile, df, digest
+        )
+    _store_session(session_id, entry)
+    await _publish_session(session_id, entry)
 
     return UploadResponse(
         session_id=session_id,
@@ -143,57 +444,186 @@ async def upload_csv(file: UploadFile = File(...)):
     )
 
 
-@app.post("/query", response_model=QueryResponse)
-async def query_data(req: QueryRequest):
-    """Ask a natural-language question about the uploaded dataset."""
-    session = sessions.get(req.session_id)
-    if not session:
+async def _load_session(session_id: str) -> tuple[dict, pd.DataFrame]:
+    """Session and its materialised frame; 404 if it exists nowhere."""
+    session = sessions.get(session_id)
+    # Redis is the source of truth for shared sessions: another worker may
+    # have deleted this one since it was cached here.
+    if session and session.get("shared") and await _touch_session(session_id) is False:
+        sessions.pop(session_id, None)
+        _released(session)
         raise HTTPException(404, "Session not found. Upload a CSV first.")
+    if not session:
+        session = await _fetch_session(session_id)
+        if not session:
+            raise HTTPException(404, "Session not found. Upload a CSV first.")
+        _store_session(session_id, session)
+
+    df: pd.DataFrame | None = session.get("df")
+    if df is None:
+        # First query on this session: materialise the spilled frame and keep it
+        df = session["df"] = await anyio.to_thread.run_sync(session["spill"].load)
+        _store_session(session_id, session)
+    return session, df
+
+
+async def _chart(result: dict) -> dict:
+    frame = result.get("result_frame")
+    return await anyio.to_thread.run_sync(
+        functools.partial(
+            viz_agent.generate,
+            result_data=frame if frame is not None else result["result_data"],
+            result_type=result["result_type"],
+            suggested_chart=result["suggested_chart"],
+            chart_x_col=result["chart_x_col"],
+            chart_y_col=result["chart_y_col"],
+            answer_summary=result["answer_summary"],
+        )
+    )
+
 
-    client      = _gradient_client()
-    query_agent = QueryAgent(client=client, model=GRADIENT_MODEL)
-    profile     = session["profile"]
-    df: pd.DataFrame = session["df"]
+def _result_fields(session_id: str, question: str, result: dict) -> dict:
+    """QueryResponse fields other than `chart`."""
+    return {
+        "session_id": session_id,
+        "question": question,
+        "answer_summary": result["answer_summary"],
+        "pandas_code": result["pandas_code"],
+        "result_type": result["result_type"],
+        "result_data": result["result_data"],
+        "error": result["error"],
+    }
 
+
+async def _answer(
+    query_agent: QueryAgent, session_id: str, question: str, session: dict, df: pd.DataFrame
+) -> QueryResponse:
     result = await query_agent.query(
-        question=req.question,
+        question=question,
         df=df,
-        schema_summary=profile["schema_summary"],
+        schema_summary=session["profile"]["schema_summary"],
+        datetime_formats=session["datetime_formats"],
+    )
+    return QueryResponse(
+        **_result_fields(session_id, question, result), chart=await _chart(result)
     )
 
-    chart = viz_agent.generate(
-        result_data=result["result_data"],
-        result_type=result["result_type"],
-        suggested_chart=result["suggested_chart"],
-        chart_x_col=result["chart_x_col"],
-        chart_y_col=result["chart_y_col"],
-        answer_summary=result["answer_summary"],
+
+def _sse(event: str, data: Any) -> bytes:
+    return b"event: %s\ndata: %s\n\n" % (
+        event.encode(), orjson.dumps(data, default=str)
     )
 
+
+def _failed(session_id: str, question: str, exc: BaseException) -> QueryResponse:
+    msg = f"{type(exc).__name__}: {exc}"
+    summary = f"Sorry, I couldn't answer that. {msg}"
     return QueryResponse(
-        session_id=req.session_id,
-        question=req.question,
-        answer_summary=result["answer_summary"],
-        pandas_code=result["pandas_code"],
-        result_type=result["result_type"],
-        result_data=result["result_data"],
-        chart=chart,
-        error=result["error"],
+        session_id=session_id,
+        question=question,
+        answer_summary=summary,
+        pandas_code="",
+        result_type="scalar",
+        result_data=None,
+        chart=viz_agent.generate(None, "scalar", "none", None, None, summary),
+        error=msg,
+    )
+
+
+@app.post("/query", response_model=QueryResponse)
+async def query_data(req: QueryRequest):
+    """Ask a natural-language question about the uploaded dataset."""
+    session, df = await _load_session(req.session_id)
+    return await _answer(_get_query_agent(), req.session_id, req.question, session, df)
+
+
+@app.post("/query/stream")
+async def query_stream(req: QueryRequest):
+    """
+    Server-Sent Events version of /query: `token` events carry the LLM reply
+    as it is generated, then `result` carries every QueryResponse field but
+    `chart`, which follows in a `chart` event. A failure mid-stream ends it
+    with an `error` event.
+    """
+    session, df = await _load_session(req.session_id)
+    query_agent = _get_query_agent()
+
+    async def events():
+        try:
+            async for event, payload in query_agent.query_stream(
+                question=req.question,
+                df=df,
+                schema_summary=session["profile"]["schema_summary"],
+                datetime_formats=session["datetime_formats"],
+            ):
+                if event == "token":
+                    yield _sse("token", payload)
+                    continue
+                yield _sse("result", _result_fields(req.session_id, req.question, payload))
+                yield _sse("chart", await _chart(payload))
+        except Exception as exc:
+            yield _sse("error", {"error": f"{type(exc).__name__}: {exc}"})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/query/batch", response_model=BatchQueryResponse)
+async def query_batch(req: BatchQueryRequest):
+    """
+    Ask several questions about one dataset. The LLM calls run concurrently
+    (at most BATCH_CONCURRENCY at a time); a failed question is reported in
+    its own result's `error` instead of failing the batch.
+    """
+    session, df = await _load_session(req.session_id)
+    query_agent = _get_query_agent()
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def one(question: str) -> QueryResponse:
+        async with limit:
+            return await _answer(query_agent, req.session_id, question, session, df)
+
+    outcomes = await asyncio.gather(
+        *(one(q) for q in req.questions), return_exceptions=True
     )
+    results = [
+        out if isinstance(out, QueryResponse) else _failed(req.session_id, q, out)
+        for q, out in zip(req.questions, outcomes)
+    ]
+    return BatchQueryResponse(session_id=req.session_id, results=results)
 
 
 @app.delete("/session/{session_id}")
-async def delete_session(session_id: str):
-    sessions.pop(session_id, None)
+async def delete_session(session_id: str) -> dict[str, str]:
+    session = sessions.pop(session_id, None)
+    if session is not None:
+        _released(session)
+    if REDIS_URL:
+        try:
+            await _redis_client().delete(_redis_key(session_id))
+        except Exception:
+            logger.warning("Redis unavailable; session %s not deleted there", session_id, exc_info=True)
     return {"deleted": session_id}
 
 
+# (fetched_at, model ids). Concurrent misses queue on the lock and the first
+# one refreshes the listing for all of them.
+_models_cache: tuple[float, list[str]] | None = None
+_models_lock = asyncio.Lock()
+
+def _models_fresh() -> bool:
+    return _models_cache is not None and time.monotonic() - _models_cache[0] < MODELS_TTL
+
 @app.get("/models")
-async def list_models():
-    """List available Gradient AI models."""
+async def list_models() -> dict[str, list[str]]:
+    """List available Gradient AI models (cached for MODELS_TTL seconds)."""
+    global _models_cache
     client = _gradient_client()
-    try:
-        models = await client.models.list()
-        return {"models": [m.id for m in models.data]}
-    except Exception as exc:
-        raise HTTPException(502, f"Cannot reach Gradient AI: {exc}") from exc
+    if not _models_fresh():
+        async with _models_lock:
+            if not _models_fresh():  # another caller may have refreshed it
+                try:
+                    models = await client.models.list()
+                except Exception as exc:
+                    raise HTTPException(502, f"Cannot reach Gradient AI: {exc}") from exc
+                _models_cache = (time.monotonic(), [m.id for m in models.data])
+    return {"models": _models_cache[1]}
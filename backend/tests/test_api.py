@@ -2,9 +2,14 @@
 Smoke tests for the FastAPI application.
 Uses httpx AsyncClient — no real network, no LLM calls.
 """
+import asyncio
 import io
 import sys
 import os
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
 import pytest
 from httpx import AsyncClient, ASGITransport
 
@@ -13,6 +18,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 # Patch env before importing app so GRADIENT_API_KEY is set
 os.environ.setdefault("GRADIENT_API_KEY", "test-key-for-ci")
 
+import main  # noqa: E402
 from main import app  # noqa: E402
 
 
@@ -66,6 +72,15 @@ async def test_upload_non_csv_rejected(client):
     assert r.status_code == 400
 
 
+async def test_upload_too_large_rejected(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_UPLOAD_BYTES", len(CSV_BYTES) - 1)
+    r = await client.post(
+        "/upload",
+        files={"file": ("sales.csv", io.BytesIO(CSV_BYTES), "text/csv")},
+    )
+    assert r.status_code == 413
+
+
 async def test_upload_empty_file_rejected(client):
     r = await client.post(
         "/upload",
@@ -105,7 +120,283 @@ async def test_delete_session(client):
     assert r3.status_code == 404
 
 
+async def test_upload_spills_frame_until_first_query(client):
+    r = await client.post(
+        "/upload",
+        files={"file": ("sales.csv", io.BytesIO(CSV_BYTES), "text/csv")},
+    )
+    session = main.sessions[r.json()["session_id"]]
+    assert "df" not in session
+    assert session["spill"].load()["revenue"].tolist() == [1000, 2000, 500]
+
+
+async def test_reupload_shares_spill_file(client, monkeypatch):
+    ids = []
+    for _ in range(2):
+        r = await client.post(
+            "/upload",
+            files={"file": ("sales.csv", io.BytesIO(CSV_BYTES), "text/csv")},
+        )
+        ids.append(r.json()["session_id"])
+        # The re-upload must be served from the spill without parsing
+        monkeypatch.setattr(main.ingest_agent, "profile_and_frame", None)
+    first, second = (main.sessions[sid] for sid in ids)
+    assert ids[0] != ids[1]
+    assert first["spill"] is second["spill"]
+
+
+async def test_session_over_memory_budget_rejected(client, monkeypatch):
+    monkeypatch.setattr(main, "sessions", main.TTLCache(
+        maxsize=1024, ttl=60, getsizeof=main._session_bytes,
+    ))
+    monkeypatch.setattr(
+        main, "_session_entry", lambda sid, profile, df, digest: {"df": df}
+    )
+    r = await client.post(
+        "/upload",
+        files={"file": ("sales.csv", io.BytesIO(CSV_BYTES), "text/csv")},
+    )
+    assert r.status_code == 413
+
+
+async def test_evicted_session_with_frame_trims_heap(monkeypatch):
+    trims = []
+    monkeypatch.setattr(
+        main, "_trim_heap", lambda: trims.append(threading.current_thread().name)
+    )
+    monkeypatch.setattr(main, "_trim_pending", False)
+    cache = main._SessionCache(maxsize=10_000, ttl=60, getsizeof=main._session_bytes)
+    df = pd.DataFrame({"a": range(100)})
+    cache["s1"] = {"df": df}
+    cache["s2"] = {"df": df}  # over budget: evicts s1
+    for _ in range(100):  # the trim runs on an executor thread
+        if trims:
+            break
+        await asyncio.sleep(0.01)
+    assert "s1" not in cache
+    assert len(trims) == 1 and trims[0] != threading.main_thread().name
+
+
 async def test_delete_nonexistent_session_ok(client):
     """Deleting a non-existent session should not error."""
     r = await client.delete("/session/does-not-exist")
     assert r.status_code == 200
+
+
+# ── Shared session store (Redis) ──────────────────────────────────────────── #
+
+class FakeRedis:
+    """In-memory stand-in for the redis.asyncio calls main.py makes."""
+
+    def __init__(self, down=False):
+        self.data = {}
+        self.down = down
+
+    def _check(self):
+        if self.down:
+            raise ConnectionError("redis down")
+
+    async def hset(self, key, mapping):
+        self._check()
+        self.data.setdefault(key, {}).update(
+            {k.encode(): v for k, v in mapping.items()}
+        )
+
+    async def expire(self, key, ttl):
+        self._check()
+        return int(key in self.data)
+
+    async def hgetall(self, key):
+        self._check()
+        return dict(self.data.get(key, {}))
+
+    async def delete(self, key):
+        self._check()
+        return int(self.data.pop(key, None) is not None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def hset(self, key, mapping):
+        self.calls.append((self.redis.hset, key, mapping))
+
+    def expire(self, key, ttl):
+        self.calls.append((self.redis.expire, key, ttl))
+
+    async def execute(self):
+        return [await method(*args) for method, *args in self.calls]
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(main, "REDIS_URL", "redis://fake")
+    monkeypatch.setattr(main, "_redis_client", lambda: redis)
+    return redis
+
+
+async def _upload(client):
+    r = await client.post(
+        "/upload",
+        files={"file": ("sales.csv", io.BytesIO(CSV_BYTES), "text/csv")},
+    )
+    assert r.status_code == 200
+    return r.json()["session_id"]
+
+
+async def test_session_published_and_fetched_by_another_worker(client, fake_redis):
+    session_id = await _upload(client)
+    assert main._redis_key(session_id) in fake_redis.data
+
+    main.sessions.pop(session_id)  # a worker that never saw the upload
+    session, df = await main._load_session(session_id)
+    assert df["revenue"].tolist() == [1000, 2000, 500]
+    assert session["profile"]["row_count"] == 3
+    assert session_id in main.sessions
+
+
+async def test_session_deleted_elsewhere_is_dropped_from_l1(client, fake_redis):
+    session_id = await _upload(client)
+    await main._load_session(session_id)
+
+    fake_redis.data.pop(main._redis_key(session_id))  # DELETE on another worker
+    with pytest.raises(main.HTTPException) as exc:
+        await main._load_session(session_id)
+    assert exc.value.status_code == 404
+    assert session_id not in main.sessions
+
+
+async def test_delete_session_removes_redis_key(client, fake_redis):
+    session_id = await _upload(client)
+    r = await client.delete(f"/session/{session_id}")
+    assert r.status_code == 200
+    assert fake_redis.data == {}
+
+
+async def test_redis_down_keeps_sessions_worker_local(client, fake_redis):
+    fake_redis.down = True
+    session_id = await _upload(client)
+    _, df = await main._load_session(session_id)
+    assert len(df) == 3
+
+    r = await client.post(
+        "/query",
+        json={"session_id": "never-uploaded", "question": "How many rows?"},
+    )
+    assert r.status_code == 503
+    assert (await client.delete(f"/session/{session_id}")).status_code == 200
+
+
+# ── Batch query ───────────────────────────────────────────────────────────── #
+
+async def test_query_batch_answers_each_question(client, monkeypatch):
+    async def fake_query(self, question, df, schema_summary, datetime_formats=None):
+        if question == "boom":
+            raise RuntimeError("LLM down")
+        return {
+            "answer_summary": f"{len(df)} rows",
+            "pandas_code": "len(df)",
+            "result_type": "scalar",
+            "result_data": len(df),
+            "result_frame": None,
+            "suggested_chart": "none",
+            "chart_x_col": None,
+            "chart_y_col": None,
+            "error": None,
+        }
+
+    monkeypatch.setattr(main.QueryAgent, "query", fake_query)
+    r = await client.post(
+        "/upload",
+        files={"file": ("sales.csv", io.BytesIO(CSV_BYTES), "text/csv")},
+    )
+    session_id = r.json()["session_id"]
+    r2 = await client.post(
+        "/query/batch",
+        json={"session_id": session_id, "questions": ["How many rows?", "boom"]},
+    )
+    assert r2.status_code == 200
+    ok, failed = r2.json()["results"]
+    assert ok["question"] == "How many rows?"
+    assert ok["result_data"] == 3
+    assert ok["error"] is None
+    assert failed["question"] == "boom"
+    assert failed["error"] == "RuntimeError: LLM down"
+
+
+async def test_query_batch_unknown_session_404(client):
+    r = await client.post(
+        "/query/batch",
+        json={"session_id": "does-not-exist", "questions": ["How many rows?"]},
+    )
+    assert r.status_code == 404
+
+
+async def test_query_stream_sends_tokens_result_and_chart(client, monkeypatch):
+    async def fake_stream(self, question, df, schema_summary, datetime_formats=None):
+        yield "token", '{"pandas_code": "len(df)"}'
+        yield "result", {
+            "answer_summary": "3 rows",
+            "pandas_code": "len(df)",
+            "result_type": "scalar",
+            "result_data": len(df),
+            "result_frame": None,
+            "suggested_chart": "none",
+            "chart_x_col": None,
+            "chart_y_col": None,
+            "error": None,
+        }
+
+    monkeypatch.setattr(main.QueryAgent, "query_stream", fake_stream)
+    r = await client.post(
+        "/upload",
+        files={"file": ("sales.csv", io.BytesIO(CSV_BYTES), "text/csv")},
+    )
+    r2 = await client.post(
+        "/query/stream",
+        json={"session_id": r.json()["session_id"], "question": "How many rows?"},
+    )
+    assert r2.status_code == 200
+    assert r2.headers["content-type"].startswith("text/event-stream")
+    events = [
+        block.split("\n", 1)[0].removeprefix("event: ")
+        for block in r2.text.strip().split("\n\n")
+    ]
+    assert events == ["token", "result", "chart"]
+    assert '"result_data":3' in r2.text
+
+
+# ── Gradient client ───────────────────────────────────────────────────────── #
+
+def test_gradient_client_and_query_agent_are_reused():
+    assert main._gradient_client() is main._gradient_client()
+    assert main._get_query_agent() is main._get_query_agent()
+
+
+async def test_models_listing_cached_and_coalesced(client, monkeypatch):
+    calls = []
+
+    async def list_models():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(data=[SimpleNamespace(id="m1")])
+
+    fake = SimpleNamespace(models=SimpleNamespace(list=list_models))
+    monkeypatch.setattr(main, "_gradient_client", lambda: fake)
+    monkeypatch.setattr(main, "_models_cache", None)
+    responses = await asyncio.gather(*(client.get("/models") for _ in range(5)))
+    responses.append(await client.get("/models"))
+    assert all(r.json() == {"models": ["m1"]} for r in responses)
+    assert len(calls) == 1
@@ -0,0 +1,98 @@
+"""
+Integration tests for the app backend's FastAPI routers (app.main).
+The Gradient AI schema summary is patched out, so no network is needed.
+"""
+import io
+import sys
+import os
+
+import pytest
+from httpx import AsyncClient, ASGITransport
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.agents import ingest  # noqa: E402
+from app.main import app  # noqa: E402
+from app.routers import chat, upload  # noqa: E402
+
+CSV_BYTES = b"region,units\nNorth,1\nSouth,2\nNorth,3\n"
+
+
+@pytest.fixture
+async def client(monkeypatch):
+    async def no_ai_summary(*args):
+        raise RuntimeError("offline")
+
+    monkeypatch.setattr(ingest, "_ai_schema_summary", no_ai_summary)
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        yield ac
+
+
+async def _upload(client, data=CSV_BYTES, name="sales.csv"):
+    return await client.post("/api/upload", files={"file": (name, io.BytesIO(data), "text/csv")})
+
+
+# ── Upload ────────────────────────────────────────────────────────────────── #
+
+async def test_upload_and_preview(client):
+    r = await _upload(client)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["rows"] == 3
+    assert body["columns"] == ["region", "units"]
+
+    r = await client.get(f"/api/datasets/{body['dataset_id']}/preview")
+    assert r.status_code == 200
+    assert r.json()["preview"][0] == {"region": "North", "units": 1}
+
+
+async def test_upload_duplicate_headers(client):
+    r = await _upload(client, b"a,a,b\n1,2,x\n3,4,y\n", "dup.csv")
+    assert r.status_code == 200
+    assert r.json()["columns"] == ["a", "a.1", "b"]
+
+
+async def test_upload_too_large_rejected(client, monkeypatch):
+    monkeypatch.setattr(upload, "MAX_BYTES", 10)
+    r = await _upload(client)
+    assert r.status_code == 413
+
+
+async def test_upload_empty_file_rejected(client):
+    r = await _upload(client, b"")
+    assert r.status_code == 400
+
+
+async def test_upload_non_csv_rejected(client):
+    r = await _upload(client, name="data.txt")
+    assert r.status_code == 400
+
+
+async def test_preview_unknown_dataset_404(client):
+    r = await client.get("/api/datasets/does-not-exist/preview")
+    assert r.status_code == 404
+
+
+# ── Chat ──────────────────────────────────────────────────────────────────── #
+
+async def test_chat_unknown_dataset_404(client):
+    r = await client.post("/api/chat", json={
+        "messages": [{"role": "user", "content": "How many rows?"}],
+        "session_id": "s1",
+        "dataset_id": "does-not-exist",
+    })
+    assert r.status_code == 404
+
+
+async def test_chat_history_is_bounded(client):
+    for i in range(chat.HISTORY_MAX):
+        r = await client.post("/api/chat", json={
+            "messages": [{"role": "user", "content": f"hello {i}"}],
+            "session_id": "bounded",
+        })
+        assert r.status_code == 200
+    messages = (await client.get("/api/chat/bounded/history")).json()["messages"]
+    assert len(messages) == chat.HISTORY_MAX
+    assert messages[-2] == {"role": "user", "content": f"hello {chat.HISTORY_MAX - 1}"}
@@ -0,0 +1,41 @@
+"""
+Tests for the app backend's ingest helpers — CSV parsing and stored frames.
+Offline only: no network, no LLM.
+"""
+import io
+import sys
+import os
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.agents.ingest import StoredFrame, _load_frame, _read_csv
+
+
+# ── _read_csv ─────────────────────────────────────────────────────────────── #
+
+def test_read_csv_nulls_match_pandas():
+    raw = b"region,units,empty\nNorth,1,\n,2,\nNA,3,\nSouth,4,\n"
+    df = _read_csv(io.BytesIO(raw))
+    expected = pd.read_csv(io.BytesIO(raw))
+    assert df["region"].isna().sum() == expected["region"].isna().sum() == 2
+    assert df["empty"].dtype == expected["empty"].dtype == "float64"
+    assert df["region"].fillna("Unknown").tolist() == ["North", "Unknown", "Unknown", "South"]
+
+
+# ── StoredFrame ───────────────────────────────────────────────────────────── #
+
+def test_stored_frame_records_compacted_memory(tmp_path):
+    df = pd.DataFrame({"region": pd.Categorical(["W", "E"] * 50), "units": range(100)})
+    frame = StoredFrame(df, str(tmp_path / "sales.arrow"))
+    assert frame.memory_bytes == df.memory_usage(deep=True).sum()
+    assert frame.memory_bytes < df.astype({"region": object}).memory_usage(deep=True).sum()
+
+
+def test_duplicate_headers_renamed_like_pandas(tmp_path):
+    raw = b"a,a,b\n1,2,x\n3,4,y\n"
+    assert _read_csv(io.BytesIO(raw)).columns.tolist() == ["a", "a.1", "b"]
+    frame, _, sample_values, _ = _load_frame(io.BytesIO(raw), str(tmp_path / "dup.arrow"))
+    assert frame.columns == ["a", "a.1", "b"]
+    assert sample_values["a.1"] == ["2", "4"]
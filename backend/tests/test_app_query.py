@@ -0,0 +1,169 @@
+"""
+Tests for the app backend's query helpers — plan validation, column pruning,
+direct answers and the grouped fast path. Offline only: no network, no LLM.
+"""
+import sys
+import os
+
+import numpy as np
+import orjson
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.agents.ingest import StoredFrame
+from app.agents.query import (
+    _compile_plan,
+    _direct_answer,
+    _grouped_plan,
+    _load_plan_frame,
+    _plan_columns,
+    _run_plan,
+)
+from app.models import QueryPlan
+
+
+@pytest.fixture
+def frame(tmp_path):
+    df = pd.DataFrame({
+        "region": ["W", "E", None, "E", "N", "W"],
+        "units": [1, 2, 3, 4, 5, 6],
+        "revenue": [10.0, np.nan, 3.5, 2.0, np.nan, 1.0],
+    })
+    return StoredFrame(df, str(tmp_path / "sales.arrow"))
+
+
+# ── _compile_plan ─────────────────────────────────────────────────────────── #
+
+@pytest.mark.parametrize("code", [
+    "df['revenue'].sum()",
+    "df.groupby('region')['units'].sum().sort_values(ascending=False).head(5)",
+    "df[df['units'] > 2]['region'].value_counts()",
+    "np.round(df['revenue'].mean(), 2)",
+])
+def test_compile_plan_accepts_pandas_expressions(code):
+    _compile_plan(code)
+
+
+@pytest.mark.parametrize("code,fragment", [
+    ("__import__('os')", "Blocked name"),
+    ("open('/etc/passwd')", "Blocked name"),
+    ("df.__class__.__bases__", "Blocked attribute"),
+    ("df._mgr", "Blocked attribute"),
+    ("df.pop('units')", "Blocked attribute: pop"),
+    ("df['region'].update(df['units'])", "Blocked attribute: update"),
+    ("df.drop(columns=['units'], inplace=True)", "inplace"),
+    ("df.drop(columns=['units'], **{'inplace': True})", "kwargs"),
+    ("lambda x: x", "Blocked operation"),
+    ("[x for x in df]", "Blocked operation"),
+])
+def test_compile_plan_blocks(code, fragment):
+    with pytest.raises(ValueError, match=fragment):
+        _compile_plan(code)
+
+
+# ── QueryPlan ─────────────────────────────────────────────────────────────── #
+
+@pytest.mark.parametrize("chart,expected", [
+    ("bar", "bar"),
+    ("none", None),
+    ("table", None),
+    (None, None),
+])
+def test_query_plan_unknown_chart_means_no_chart(chart, expected):
+    raw = orjson.dumps({"pandas_code": "len(df)", "suggest_chart": chart})
+    assert QueryPlan.model_validate_json(raw).suggest_chart == expected
+
+
+# ── Column pruning ────────────────────────────────────────────────────────── #
+
+@pytest.mark.parametrize("code,columns", [
+    ("df['revenue'].sum()", {"revenue"}),
+    ("df[['region', 'units']].head()", {"region", "units"}),
+    ("df.groupby('region')['units'].mean()", {"region", "units"}),
+    ("df.units.max()", {"units"}),
+    ("df.head()", None),
+    ("df[df['units'] > 2]", None),
+    ("df.groupby('region').sum()", None),
+])
+def test_plan_columns(code, columns):
+    assert _plan_columns(code) == (frozenset(columns) if columns else None)
+
+
+def test_load_plan_frame_reads_only_referenced_columns(frame):
+    assert _load_plan_frame(frame, "df['units'].sum()").columns.tolist() == ["units"]
+    # Unknown columns fall back to the whole frame so pandas raises KeyError
+    assert _load_plan_frame(frame, "df['nope'].sum()").columns.tolist() == frame.columns
+
+
+# ── _direct_answer ────────────────────────────────────────────────────────── #
+
+@pytest.fixture
+def dataset(frame):
+    return {"frame": frame, "preview_records": [{"row": i} for i in range(len(frame))]}
+
+
+@pytest.mark.parametrize("question,code", [
+    ("How many rows are there?", "len(df)"),
+    ("how many records in the dataset", "len(df)"),
+    ("What columns does the data have?", "df.columns.tolist()"),
+    ("list all columns", "df.columns.tolist()"),
+    ("Show me the first 3 rows", "df.head(3)"),
+    ("show the head of the data", "df.head(5)"),
+    ("Summarize my data.", "df.describe()"),
+])
+async def test_direct_answer_matches(dataset, question, code):
+    answer = await _direct_answer(question, dataset)
+    assert answer is not None and answer["raw_code"] == code
+
+
+async def test_direct_answer_head_uses_preview(dataset):
+    answer = await _direct_answer("show me the first 3 rows", dataset)
+    assert answer["table_data"] == [{"row": 0}, {"row": 1}, {"row": 2}]
+
+
+@pytest.mark.parametrize("question", [
+    "Which columns drive revenue?",
+    "how many rows have revenue above 5?",
+    "show me the first rows where units > 2",
+])
+async def test_direct_answer_defers_to_llm(dataset, question):
+    assert await _direct_answer(question, dataset) is None
+
+
+# ── Grouped fast path ─────────────────────────────────────────────────────── #
+
+@pytest.mark.parametrize("code", [
+    "df.groupby('region')['revenue'].sum()",
+    "df.groupby('region')['revenue'].mean().sort_values(ascending=False)",
+    "df.groupby('region')['units'].sum().head(2)",
+    "df.groupby('region')['units'].mean()",
+    "df.groupby('region')['units'].max()",
+    "df.groupby('region')['revenue'].min()",
+    "df.groupby('region')['revenue'].count()",
+    "df.groupby('region')['revenue'].sum().reset_index()",
+])
+def test_grouped_fast_path_matches_pandas(frame, code):
+    assert _grouped_plan(code) is not None
+    expected = eval(code, {"df": frame.to_pandas(), "pd": pd, "np": np})
+    result = _run_plan(code, {"frame": frame})
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(result, expected)
+    else:
+        pd.testing.assert_series_equal(result, expected)
+
+
+def test_grouped_fast_path_leaves_downcast_columns_to_pandas(tmp_path):
+    df = pd.DataFrame({"region": ["W", "W", "E"], "units": np.array([100, 100, 5], dtype=np.int8)})
+    frame = StoredFrame(df, str(tmp_path / "small.arrow"))
+    result = _run_plan("df.groupby('region')['units'].sum()", {"frame": frame})
+    pd.testing.assert_series_equal(result, df.groupby("region")["units"].sum())
+    assert result["W"] == 200
+
+
+def test_grouped_fast_path_skips_duplicate_columns(tmp_path):
+    df = pd.DataFrame([["W", 1, 2], ["E", 3, 4]], columns=["region", "units", "units"])
+    frame = StoredFrame(df, str(tmp_path / "dup.arrow"))
+    code = "df.groupby('region')['units'].sum()"
+    pd.testing.assert_frame_equal(_run_plan(code, {"frame": frame}), eval(code, {"df": df}))
@@ -5,11 +5,12 @@ Offline only: no network, no LLM.
 import io
 import sys
 import os
+import pandas as pd
 import pytest
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
-from agents.ingest_agent import IngestAgent
+from agents.ingest_agent import IngestAgent, _records, content_hasher
 
 
 def _csv(content: str) -> bytes:
@@ -93,3 +94,101 @@ def test_large_column_is_text(agent):
     profile = agent.ingest(csv, "big.csv")
     col_map = {c["name"]: c for c in profile["columns"]}
     assert col_map["user_id"]["dtype"] == "text"
+
+
+def test_repetitive_text_stored_as_category(agent):
+    """Repetitive strings are held as category but still profiled as text."""
+    rows = "\n".join(f"city_{i // 3},{i}" for i in range(600))
+    csv = _csv(f"city,value\n{rows}")
+    profile, df = agent.profile_and_frame(csv, "cities.csv")
+    col_map = {c["name"]: c for c in profile["columns"]}
+    assert col_map["city"]["dtype"] == "text"
+    assert isinstance(df["city"].dtype, pd.CategoricalDtype)
+    assert df["value"].dtype == "int64"
+
+
+def test_us_date_format_detected(agent):
+    csv = _csv("""
+order_date,amount
+01/15/2024,10
+02/03/2024,20
+12/31/2024,30
+""")
+    profile = agent.ingest(csv, "orders.csv")
+    col_map = {c["name"]: c for c in profile["columns"]}
+    assert col_map["order_date"]["dtype"] == "datetime"
+    assert col_map["order_date"]["min"].startswith("2024-01-15")
+
+
+def test_rows_capped_at_max_rows(agent):
+    agent.MAX_ROWS = 50
+    rows = "\n".join(f"{i},{i * 2}" for i in range(1_000))
+    profile = agent.ingest(_csv(f"a,b\n{rows}"), "long.csv")
+    assert profile["row_count"] == 50
+    assert agent._truncate_to_max_rows(_csv(f"a,b\n{rows}")).count(b"\n") == 51
+
+
+def test_rows_capped_exactly_when_later_rows_are_longer(agent):
+    agent.MAX_ROWS = 2_000
+    short = [f"{i},x" for i in range(1_000)]
+    long = [f"{i},{'y' * 200}" for i in range(1_000, 4_000)]
+    profile = agent.ingest(_csv("a,b\n" + "\n".join(short + long)), "skewed.csv")
+    assert profile["row_count"] == 2_000
+
+
+def test_rows_capped_with_quoted_newlines(agent):
+    agent.MAX_ROWS = 100
+    rows = "\n".join(f'{i},"line one\nline two"' for i in range(300))
+    profile, df = agent.profile_and_frame(_csv(f"a,b\n{rows}"), "quoted.csv")
+    assert profile["row_count"] == 100
+    assert df["b"].eq("line one\nline two").all()
+
+
+def test_identical_upload_reuses_profile(agent):
+    csv = _csv("a,b\n1,2\n3,4")
+    first = agent.ingest(csv, "same.csv")
+    assert agent.ingest(csv, "same.csv") is first
+    assert agent.ingest(csv, "other.csv") is not first
+
+
+def test_datetime_conversion_deferred(agent):
+    csv = _csv("""
+day,amount
+2024-01-01,10
+2024-01-02,20
+""")
+    profile = agent.ingest(csv, "days.csv")
+    col_map = {c["name"]: c for c in profile["columns"]}
+    assert profile["datetime_formats"] == {"day": "ISO8601"}
+    assert col_map["day"]["dtype"] == "datetime"
+    assert col_map["day"]["max"].startswith("2024-01-02")
+
+
+def test_profile_and_frame_returns_isolated_frames(agent):
+    csv = _csv("a,b\n1,x\n3,y")
+    profile, df = agent.profile_and_frame(csv, "frame.csv")
+    assert len(df) == profile["row_count"] == 2
+    df["a"] = df["a"] * 10  # e.g. a session converting a column in place
+    cached_profile, again = agent.profile_and_frame(csv, "frame.csv")
+    assert cached_profile is profile
+    assert again["a"].tolist() == [1, 3]
+
+
+def test_profile_cache_does_not_keep_frames(agent):
+    csv = _csv("a,b\n1,x\n3,y")
+    profile, df = agent.profile_and_frame(csv, "frame.csv")
+    assert all(cached is profile for cached in agent._profile_cache.values())
+    assert agent.cached_profile(content_hasher(csv).digest(), "frame.csv") is profile
+
+
+def test_records_keep_full_precision():
+    df = pd.DataFrame({
+        "x": [0.1 + 0.2, float("nan")],
+        "n": [2**60, 1],
+        "day": pd.to_datetime(["2024-01-01", None]),
+        "wait": pd.to_timedelta(["1 day", None]),
+    })
+    assert _records(df) == [
+        {"x": 0.30000000000000004, "n": 2**60, "day": "2024-01-01T00:00:00", "wait": "1 days 00:00:00"},
+        {"x": None, "n": 1, "day": None, "wait": None},
+    ]
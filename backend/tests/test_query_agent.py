@@ -0,0 +1,250 @@
+"""
+Tests for QueryAgent helpers — LLM streaming, execution, serialisation.
+Offline only: the OpenAI client is replaced with a local fake.
+"""
+import gc
+import sys
+import os
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from agents.query_agent import QueryAgent, _JSONObjectScanner, _grouped_plan
+
+
+# ── Fakes ─────────────────────────────────────────────────────────────────── #
+
+class _FakeStream:
+    def __init__(self, deltas):
+        self._deltas = list(deltas)
+        self.consumed = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.consumed >= len(self._deltas):
+            raise StopAsyncIteration
+        delta = self._deltas[self.consumed]
+        self.consumed += 1
+        return SimpleNamespace(
+            choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))]
+        )
+
+    async def close(self):
+        self.closed = True
+
+
+class _FakeClient:
+    def __init__(self, stream):
+        self.calls = []
+
+        async def create(**kwargs):
+            self.calls.append(kwargs)
+            return stream
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+# ── JSON object scanner ───────────────────────────────────────────────────── #
+
+def test_scanner_stops_at_top_level_close():
+    s = _JSONObjectScanner()
+    assert s.feed('{"a": {"b": 1}') is False
+    assert s.feed("}") is True
+
+
+def test_scanner_ignores_braces_in_strings():
+    s = _JSONObjectScanner()
+    assert s.feed('{"code": "df[\\"}\\"]", "x": "{"') is False
+    assert s.feed("}") is True
+
+
+# ── _stream_llm ───────────────────────────────────────────────────────────── #
+
+async def test_stream_llm_closes_stream_after_object():
+    stream = _FakeStream(['{"pandas_code": ', '"len(df)"}', " trailing"])
+    agent = QueryAgent(client=_FakeClient(stream), model="m")
+    raw = "".join([delta async for delta in agent._stream_llm("question")])
+    assert raw == '{"pandas_code": "len(df)"}'
+    assert stream.consumed == 2
+    assert stream.closed is True
+
+
+async def test_query_reuses_plan_for_repeat_question():
+    stream = _FakeStream(['{"pandas_code": "len(df)", "answer_summary": "n"}'])
+    client = _FakeClient(stream)
+    agent = QueryAgent(client=client, model="m")
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    first = await agent.query("How many rows?", df, "schema")
+    second = await agent.query("How many rows?", df, "schema")
+    assert first["result_data"] == second["result_data"] == 3
+    assert len(client.calls) == 1
+
+
+async def test_query_does_not_cache_unparseable_plan():
+    client = _FakeClient(_FakeStream(["not json"]))
+    agent = QueryAgent(client=client, model="m")
+    df = pd.DataFrame({"a": [1]})
+    assert (await agent.query("q", df, "schema"))["error"]
+    await agent.query("q", df, "schema")
+    assert len(client.calls) == 2
+
+
+async def test_query_does_not_cache_plan_that_fails_to_run():
+    client = _FakeClient(_FakeStream(['{"pandas_code": "df[\'missing\'].sum()"}']))
+    agent = QueryAgent(client=client, model="m")
+    df = pd.DataFrame({"a": [1]})
+    assert (await agent.query("q", df, "schema"))["error"]
+    await agent.query("q", df, "schema")
+    assert len(client.calls) == 2
+
+
+def test_results_dropped_with_their_frame():
+    agent = QueryAgent(client=None, model="m")
+    df = pd.DataFrame({"a": [1]})
+    agent._memo_for(df).results["len(df)"] = (1, "scalar", None)
+    assert id(df) in agent._memos
+    key = id(df)
+    del df
+    gc.collect()
+    assert key not in agent._memos
+
+
+async def test_query_stream_yields_tokens_then_result():
+    stream = _FakeStream(['{"pandas_code": ', '"len(df)"}'])
+    agent = QueryAgent(client=_FakeClient(stream), model="m")
+    df = pd.DataFrame({"a": [1, 2]})
+    events = [e async for e in agent.query_stream("q", df, "schema")]
+    assert events[:2] == [("token", '{"pandas_code": '), ("token", '"len(df)"}')]
+    assert events[2][0] == "result"
+    assert events[2][1]["result_data"] == 2
+    assert stream.closed is True
+
+
+async def test_query_evaluates_off_the_event_loop(monkeypatch):
+    threads = []
+    agent = QueryAgent(client=_FakeClient(_FakeStream(['{"pandas_code": "len(df)"}'])), model="m")
+    run = agent._run
+    monkeypatch.setattr(agent, "_run", lambda *a: threads.append(threading.get_ident()) or run(*a))
+    result = await agent.query("q", pd.DataFrame({"a": [1]}), "schema")
+    assert result["result_data"] == 1
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_memo_cleared_when_datetime_column_converted():
+    df = pd.DataFrame({"day": ["2024-01-01", "2024-02-01"], "n": [1, 2]})
+    formats = {"day": "ISO8601"}
+    agent = QueryAgent(client=None, model="m")
+    code = "df.dtypes.astype(str)"
+    before = agent._run({"pandas_code": code}, df, formats)
+    agent._run({"pandas_code": "df['day'].max()"}, df, formats)
+    after = agent._run({"pandas_code": code}, df, formats)
+    assert before["result_data"] != after["result_data"]
+    assert "datetime64" in str(after["result_data"])
+
+
+def test_large_results_not_memoised(monkeypatch):
+    monkeypatch.setattr(QueryAgent, "RESULT_CACHE_MAX_ROWS", 2)
+    agent = QueryAgent(client=None, model="m")
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    agent._run({"pandas_code": "df.head(2)"}, df, None)
+    agent._run({"pandas_code": "df[df['a'] > 0]"}, df, None)
+    assert list(agent._memo_for(df).results) == ["df.head(2)"]
+
+
+def test_group_codes_not_shared_across_dtype_change():
+    agent = QueryAgent(client=None, model="m")
+    df = pd.DataFrame({"day": ["2024-01-02", "2024-01-01"], "n": [1, 2]})
+    memo = agent._memo_for(df)
+    snapshot = df.copy(deep=False)
+    df["day"] = pd.to_datetime(df["day"])
+    agent._group_codes(memo, snapshot, "day")  # a plan still on the old frame
+    _, labels = agent._group_codes(memo, df, "day")
+    assert pd.api.types.is_datetime64_any_dtype(labels)
+
+
+# ── _parse ────────────────────────────────────────────────────────────────── #
+
+@pytest.mark.parametrize("raw", [
+    '{"pandas_code": "len(df)"}',
+    '```json\n{"pandas_code": "len(df)"}\n```',
+    '```\n{"pandas_code": "len(df)"}```',
+])
+def test_parse_strips_fences(raw):
+    agent = QueryAgent(client=None, model="m")
+    assert agent._parse(raw) == {"pandas_code": "len(df)"}
+
+
+# ── _execute ──────────────────────────────────────────────────────────────── #
+
+def test_execute_uses_safe_builtins():
+    agent = QueryAgent(client=None, model="m")
+    df = pd.DataFrame({"revenue": [1.234, 2.345]})
+    assert agent._execute("round(df['revenue'].sum(), 2)", df) == (3.58, "scalar")
+
+
+def test_execute_does_not_mutate_stored_frame():
+    agent = QueryAgent(client=None, model="m")
+    df = pd.DataFrame({"a": [1, 2], "b": [3, 4]})
+    agent._execute("df.pop('a')", df)
+    assert df.columns.tolist() == ["a", "b"]
+
+
+@pytest.mark.parametrize("code", [
+    "df['region'].fillna('Unknown').value_counts()",
+    "df['region'].max()",
+])
+def test_category_stored_text_behaves_like_strings(code):
+    agent = QueryAgent(client=None, model="m")
+    text = pd.DataFrame({"region": ["W", "E", None, "E"], "units": [1, 2, 3, 4]})
+    stored = text.astype({"region": "category"})
+    expected = eval(code, {"df": text, "pd": pd, "np": np})
+    result = agent._evaluate(code, stored)
+    if isinstance(expected, pd.Series):
+        pd.testing.assert_series_equal(result, expected)
+    else:
+        assert result == expected
+    assert isinstance(stored["region"].dtype, pd.CategoricalDtype)
+
+
+def test_referenced_datetime_columns_converted_once():
+    agent = QueryAgent(client=None, model="m")
+    df = pd.DataFrame({"day": ["2024-01-01", "2024-02-01"], "other": ["x", "y"]})
+    formats = {"day": "ISO8601", "other_day": "ISO8601"}
+    agent._materialise_datetimes("df['day'].max()", df, formats)
+    assert pd.api.types.is_datetime64_any_dtype(df["day"])
+    assert formats == {"other_day": "ISO8601"}
+
+
+@pytest.mark.parametrize("code", [
+    "df.groupby('region')['revenue'].sum()",
+    "df.groupby('region')['revenue'].mean().sort_values(ascending=False)",
+    "df.groupby('region')['units'].sum().head(2)",
+    "df.groupby('region')['units'].mean()",
+    "df.groupby('cat')['units'].max()",
+    "df.groupby('cat')['revenue'].min()",
+    "df.groupby('region')['revenue'].count()",
+    "df.groupby('region')['revenue'].sum().reset_index()",
+])
+def test_grouped_fast_path_matches_pandas(code):
+    df = pd.DataFrame({
+        "region": ["W", "E", None, "E", "N", "W"],
+        "cat": pd.Categorical(["a", "b", "a", "b", "a", "a"], categories=["a", "b", "z"]),
+        "units": [1, 2, 3, 4, 5, 6],
+        "revenue": [10.0, np.nan, 3.5, 2.0, np.nan, 1.0],
+    })
+    agent = QueryAgent(client=None, model="m")
+    assert _grouped_plan(code) is not None
+    expected = eval(code, {"df": df, "pd": pd, "np": np})
+    result = agent._evaluate(code, df)
+    if isinstance(expected, pd.DataFrame):
+        pd.testing.assert_frame_equal(result, expected)
+    else:
+        pd.testing.assert_series_equal(result, expected)
@@ -2,8 +2,11 @@
 Tests for VizAgent — Recharts-compatible chart config generation.
 Offline only: no network, no LLM.
 """
+import math
 import sys
 import os
+
+import pandas as pd
 import pytest
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -104,7 +107,6 @@ def test_no_numeric_column_no_chart(viz):
 
 
 def test_nan_cleaned_from_output(viz):
-    import math
     data = [{"cat": "A", "val": float("nan")}, {"cat": "B", "val": 10.0}]
     cfg = viz.generate(
         result_data=data,
@@ -117,3 +119,25 @@ def test_nan_cleaned_from_output(viz):
     # NaN row: val should be None in the output, not float nan
     val_a = next(r["val"] for r in cfg["data"] if r["cat"] == "A")
     assert val_a is None or (isinstance(val_a, float) and math.isnan(val_a)) is False
+
+
+def test_dataframe_input(viz):
+    df = pd.DataFrame({
+        "region": ["North", "South"],
+        "revenue": [1000.0, float("nan")],
+        "label": ["a", "b"],
+    })
+    cfg = viz.generate(
+        result_data=df,
+        result_type="table",
+        suggested_chart="none",
+        chart_x_col="region",
+        chart_y_col=None,
+        answer_summary="Revenue by region",
+    )
+    assert cfg["chart_type"] == "bar"
+    assert cfg["y_keys"] == ["revenue"]
+    assert cfg["data"] == [
+        {"region": "North", "revenue": 1000.0},
+        {"region": "South", "revenue": None},
+    ]